@@ -1,4 +1,3 @@
-import shutil
 import textwrap
 import webbrowser
 from pathlib import Path
@@ -7,6 +6,16 @@ import nox
 
 nox.options.sessions = ["check", "generate"]
 
+GENERATE_DEPENDENCIES = [
+    "packaging",
+    "requests",
+    "urllib3<2",
+    "rich",
+    "pkg_metadata",
+    # Optional, speeds up encoding of the payloads.
+    "numpy",
+]
+
 
 # Keep versions in sync with .github/workflows/check.yml
 @nox.session(
@@ -46,8 +55,8 @@ def check(session):
     session.run("python", "-m", "pip", "uninstall", "pip", "--yes")
     # Run the pip.pyz file
     session.run("python", "scripts/check_zipapp.py", str(public / "pip.pyz"), "--version")
-    # Run the get-pip.py file
-    session.run("python", str(location))
+    # Run the get-pip.py file, passing on any arguments (e.g. --index-url)
+    session.run("python", str(location), *session.posargs)
     # Ensure that pip is installed
     session.run("python", "-m", "pip", "--version")
     session.run("pip", "--version")
@@ -56,12 +65,49 @@ def check(session):
 @nox.session
 def generate(session):
     """Update the scripts, to the latest versions."""
-    session.install("packaging", "requests", "urllib3<2", "cachecontrol[filecache]", "rich", "pkg_metadata")
+    run_generate(session, *session.posargs)
 
-    public = Path("public")
-    shutil.rmtree(public, ignore_errors=True)
 
-    session.run("python", "scripts/generate.py")
+def run_generate(session, *args):
+    session.install(*GENERATE_DEPENDENCIES)
+    session.run("python", "scripts/generate.py", *args)
+
+
+@nox.session
+def lock(session):
+    """Lock pip's releases, and save the wheels needed for an offline build."""
+    if len(session.posargs) != 2:
+        session.error("Usage: nox -s lock -- <lockfile> <wheel-dir>")
+
+    lockfile, wheel_dir = session.posargs
+    run_generate(
+        session,
+        "--update-lockfile",
+        f"--lockfile={lockfile}",
+        f"--wheel-dir={wheel_dir}",
+    )
+
+
+@nox.session
+def benchmark(session):
+    """Measure the hot paths of the generator, against local pip wheels."""
+    if not session.posargs:
+        session.error("Usage: nox -s benchmark -- <corpus-dir> [--baseline <path>]")
+
+    session.install(*GENERATE_DEPENDENCIES)
+    session.run("python", "scripts/benchmark.py", *session.posargs)
+
+
+@nox.session
+def benchmark_bootstrap(session):
+    """Measure how long each phase of bootstrapping pip takes, per interpreter."""
+    if not session.posargs:
+        session.error(
+            "Usage: nox -s benchmark_bootstrap -- --wheel-dir <dir> [--output <path>]"
+        )
+
+    session.install("rich")
+    session.run("python", "scripts/benchmark_bootstrap.py", *session.posargs)
 
 
 @nox.session(name="update-for-release")
@@ -88,8 +134,8 @@ def update_for_release(session):
     session.run("git", "branch", release_branch, external=True)
     session.run("git", "checkout", release_branch, external=True)
 
-    # Generate the scripts.
-    generate(session)
+    # Generate the scripts, from scratch, so that nothing stale is committed.
+    run_generate(session, "--full")
 
     # Make the commit and present it to the user.
     session.run("git", "add", ".", external=True)
@@ -0,0 +1,410 @@
+"""Benchmark the hot paths of scripts/generate.py, against local pip wheels.
+
+Every benchmark runs against a fixed corpus of pip wheels, old and new, which
+are taken from a local directory, so no network access is needed. The results
+can be stored as a baseline, which later runs are compared against.
+
+Usage: python scripts/benchmark.py CORPUS_DIR [--baseline PATH]
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import re
+import tempfile
+import time
+import tracemalloc
+from base64 import b85encode
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from zipfile import ZipFile
+
+import generate
+from generate import (
+    SCRIPT_CONSTRAINTS,
+    WheelArtifacts,
+    determine_latest,
+    determine_template,
+    encode_wheel_contents,
+    generate_one,
+    generate_zipapp,
+    get_ordered_templates,
+    populated_script_constraints,
+    repack_wheel,
+    solid_archive,
+)
+from packaging.specifiers import SpecifierSet
+from packaging.utils import parse_wheel_filename
+from packaging.version import Version
+from rich.console import Console
+from rich.table import Table
+
+# The pip releases that are benchmarked against: the oldest that get-pip.py
+# still ships, some in between, and a recent one, which is also a zipapp.
+CORPUS = ["9.0.3", "20.3.4", "23.2.1", "26.0.1"]
+
+# How many times `determine_template()` is called per measurement, since a
+# single call is too quick to time.
+TEMPLATE_CALLS = 1000
+
+# Peaks this close to their baseline are never regressions, since small peaks
+# vary by more than any sensible threshold.
+MEMORY_SLACK = 64 * 1024
+
+Benchmark = Tuple[str, str, int, Callable[[], object]]
+
+
+def recompress_wheel(data: bytes) -> bytes:
+    """`repack_wheel()`, inflating and deflating every member again.
+
+    This is how wheels used to be repacked, and is kept as a point of comparison.
+    """
+    new_data = BytesIO()
+    with ZipFile(BytesIO(data)) as existing_zip:
+        with ZipFile(new_data, mode="w") as new_zip:
+            for zipinfo in existing_zip.infolist():
+                if re.search(r"pip-.+\.dist-info/", zipinfo.filename):
+                    continue
+                new_zip.writestr(zipinfo, existing_zip.read(zipinfo))
+
+    return new_data.getvalue()
+
+
+def stdlib_encode_wheel_contents(data: bytes) -> str:
+    """`encode_wheel_contents()`, using `base64.b85encode()` and slicing strings.
+
+    This is how payloads used to be encoded, and is kept as a point of comparison.
+    """
+    zipdata = b85encode(data).decode("utf8")
+
+    chunked = []
+    for i in range(0, len(zipdata), 79):
+        chunked.append(zipdata[i : i + 79])
+
+    return "\n".join(chunked)
+
+
+def python_encode_wheel_contents(data: bytes) -> str:
+    """`encode_wheel_contents()`, with the pure Python fallback forced."""
+    numpy, generate.numpy = generate.numpy, None
+    try:
+        return encode_wheel_contents(data)
+    finally:
+        generate.numpy = numpy
+
+
+def cpu_time(func: Callable[[], object], *, repeat: int) -> float:
+    """The lowest CPU time, in seconds, taken by `func()` over `repeat` runs."""
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.process_time()
+        func()
+        timings.append(time.process_time() - start)
+    return min(timings)
+
+
+def peak_memory(func: Callable[[], object]) -> int:
+    """The peak size, in bytes, of what `func()` allocates, as traced."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def find_corpus(directory: Path) -> Dict[Version, Path]:
+    """Find the wheel of every release in `CORPUS`, in `directory`."""
+    corpus = {}
+    for path in directory.glob("pip-*.whl"):
+        version = parse_wheel_filename(path.name)[1]
+        if str(version) in CORPUS:
+            corpus[version] = path
+
+    missing = [version for version in CORPUS if Version(version) not in corpus]
+    if missing:
+        raise SystemExit(
+            f"No wheels for pip {', '.join(missing)} in {directory}. "
+            f"`nox -s lock -- pip-lock.json {directory}` saves them."
+        )
+    return dict(sorted(corpus.items()))
+
+
+def benchmarks(corpus: Dict[Version, Path]) -> Iterator[Benchmark]:
+    """Yield every benchmark, as (name, pip version, bytes of input, function).
+
+    The functions which write files write them relative to the current
+    directory, which needs to have the templates in it.
+    """
+    console = Console(quiet=True)
+
+    # The variant that each wheel would be used for, were the corpus all of
+    # pip's releases.
+    variants = {}
+    for variant, mapping in populated_script_constraints(SCRIPT_CONSTRAINTS):
+        if not list(SpecifierSet(mapping["pip"]).filter(corpus)):
+            continue
+        version = determine_latest(corpus.keys(), constraint=mapping["pip"])
+        variants.setdefault(version, (variant, mapping))
+
+    for version, path in corpus.items():
+        label = str(version)
+        data = path.read_bytes()
+        repacked = repack_wheel(data)
+
+        yield "repack_wheel", label, len(data), lambda: repack_wheel(data)
+        yield "solid_archive", label, len(repacked), lambda: solid_archive(repacked)
+        yield (
+            "encode_wheel_contents",
+            label,
+            len(repacked),
+            lambda: encode_wheel_contents(repacked),
+        )
+
+        def template_lookup() -> None:
+            for _ in range(TEMPLATE_CALLS):
+                get_ordered_templates.cache_clear()
+                determine_template(version)
+
+        yield "determine_template", label, 0, template_lookup
+
+        if version in variants:
+            variant, mapping = variants[version]
+            yield (
+                "generate_one",
+                label,
+                len(data),
+                lambda: generate_one(
+                    variant,
+                    mapping,
+                    console=console,
+                    pip_version=version,
+                    wheel=WheelArtifacts(path),
+                ),
+            )
+
+        if version >= generate.OLDEST_ZIPAPP:
+            yield (
+                "generate_zipapp",
+                label,
+                len(data),
+                lambda: generate_zipapp(
+                    version, console=console, wheel=WheelArtifacts(path)
+                ),
+            )
+
+
+def run_benchmarks(
+    corpus: Dict[Version, Path], *, repeat: int, console: Console
+) -> Dict[str, Any]:
+    """Measure the CPU time and the peak memory of every benchmark."""
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    sizes: Dict[str, int] = {}
+    templates = Path("templates").resolve()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.symlink(templates, Path(workdir) / "templates")
+        os.chdir(workdir)
+        try:
+            for name, version, size, func in benchmarks(corpus):
+                console.log(f"Running [magenta]{name}[reset] on [green]pip {version}")
+                func()  # Warm up, so that every run does the same work.
+                results.setdefault(name, {})[version] = {
+                    "seconds": cpu_time(func, repeat=repeat),
+                    "peak_bytes": peak_memory(func),
+                }
+                sizes[f"{name}:{version}"] = size
+        finally:
+            os.chdir(cwd)
+
+    return {
+        "python": platform.python_version(),
+        "numpy": generate.numpy is not None,
+        "corpus": {
+            path.name: hashlib.sha256(path.read_bytes()).hexdigest()
+            for path in corpus.values()
+        },
+        "sizes": sizes,
+        "results": results,
+    }
+
+
+def compare(
+    current: Dict[str, Any], baseline: Optional[Dict[str, Any]], *, threshold: float
+) -> Tuple[Table, List[str]]:
+    """Compare results against a baseline, returning a table and the regressions.
+
+    A regression is a benchmark which takes more CPU time, or allocates more at
+    its peak, than its baseline does by more than `threshold` (a fraction).
+    """
+    if baseline is None:
+        baseline = {"results": {}}
+    elif current["corpus"] != baseline["corpus"]:
+        raise SystemExit("The baseline was recorded against a different corpus.")
+
+    table = Table(title=f"Results (regressions: over {threshold:.0%} worse)")
+    table.add_column("Benchmark")
+    table.add_column("pip")
+    table.add_column("Throughput", justify="right")
+    table.add_column("CPU time", justify="right")
+    table.add_column("Change", justify="right")
+    table.add_column("Peak memory", justify="right")
+    table.add_column("Change", justify="right")
+
+    regressions = []
+    for name, versions in current["results"].items():
+        for version, result in versions.items():
+            base = baseline["results"].get(name, {}).get(version)
+            size = current["sizes"][f"{name}:{version}"]
+            if size:
+                throughput = f"{size / result['seconds'] / 1024 / 1024:.0f} MiB/s"
+            else:
+                throughput = f"{TEMPLATE_CALLS / result['seconds']:.0f}/s"
+
+            cells = [
+                name,
+                version,
+                throughput,
+                f"{result['seconds'] * 1000:.1f} ms",
+                "-",
+                f"{result['peak_bytes'] / 1024 / 1024:.2f} MiB",
+                "-",
+            ]
+            if base is not None:
+                for column, key, label in (
+                    (4, "seconds", "slower"),
+                    (6, "peak_bytes", "more memory"),
+                ):
+                    change = result[key] / base[key] - 1 if base[key] else 0
+                    slack = MEMORY_SLACK if key == "peak_bytes" else 0
+                    if change > threshold and result[key] - base[key] > slack:
+                        cells[column] = f"[red]{change:+.0%}"
+                        regressions.append(
+                            f"{name} on pip {version}: {change:.0%} {label}"
+                        )
+                    else:
+                        cells[column] = f"{change:+.0%}"
+            table.add_row(*cells)
+
+    return table, regressions
+
+
+def benchmark_repack(wheels: List[Path], *, repeat: int) -> Table:
+    table = Table(title="repack_wheel() CPU time per wheel")
+    table.add_column("Wheel")
+    table.add_column("Size", justify="right")
+    table.add_column("Recompress", justify="right")
+    table.add_column("Copy as-is", justify="right")
+    table.add_column("Saved", justify="right")
+
+    for wheel in wheels:
+        data = wheel.read_bytes()
+        # The copy must be a drop-in replacement for recompression.
+        assert repack_wheel(data) == recompress_wheel(data), wheel.name
+
+        before = cpu_time(lambda: recompress_wheel(data), repeat=repeat)
+        after = cpu_time(lambda: repack_wheel(data), repeat=repeat)
+        table.add_row(
+            wheel.name,
+            f"{len(data) / 1024 / 1024:.1f} MiB",
+            f"{before * 1000:.0f} ms",
+            f"{after * 1000:.0f} ms",
+            f"{(before - after) * 1000:.0f} ms ({1 - after / before:.0%})",
+        )
+
+    return table
+
+
+def benchmark_encode(wheels: List[Path], *, repeat: int) -> Table:
+    table = Table(title="encode_wheel_contents() CPU time per repacked wheel")
+    table.add_column("Wheel")
+    table.add_column("Size", justify="right")
+    table.add_column("b85encode", justify="right")
+    table.add_column("Pure Python", justify="right")
+    table.add_column("NumPy", justify="right")
+
+    for wheel in wheels:
+        data = repack_wheel(wheel.read_bytes())
+        # Both encoders must produce exactly what b85encode() does.
+        expected = stdlib_encode_wheel_contents(data)
+        assert python_encode_wheel_contents(data) == expected, wheel.name
+
+        timings = [
+            cpu_time(lambda: stdlib_encode_wheel_contents(data), repeat=repeat),
+            cpu_time(lambda: python_encode_wheel_contents(data), repeat=repeat),
+        ]
+        if generate.numpy is not None:
+            assert encode_wheel_contents(data) == expected, wheel.name
+            timings.append(cpu_time(lambda: encode_wheel_contents(data), repeat=repeat))
+
+        cells = [f"{t * 1000:.0f} ms" for t in timings]
+        if generate.numpy is None:
+            cells.append("not installed")
+        table.add_row(wheel.name, f"{len(data) / 1024 / 1024:.1f} MiB", *cells)
+
+    return table
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "corpus",
+        type=Path,
+        metavar="CORPUS_DIR",
+        help=f"directory with the wheels of pip {', '.join(CORPUS)}",
+    )
+    parser.add_argument("--repeat", type=int, default=5, metavar="N")
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        metavar="PATH",
+        help="compare against the results in PATH, or store them there if it is missing",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="store the results in the --baseline, even if it exists",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        metavar="FRACTION",
+        help="how much worse a result can be than its baseline (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="also compare against the implementations that were replaced",
+    )
+    args = parser.parse_args()
+    if args.update_baseline and args.baseline is None:
+        parser.error("--update-baseline requires --baseline")
+
+    console = Console()
+    corpus = find_corpus(args.corpus)
+    if args.compare:
+        console.print(benchmark_repack(list(corpus.values()), repeat=args.repeat))
+        console.print(benchmark_encode(list(corpus.values()), repeat=args.repeat))
+
+    current = run_benchmarks(corpus, repeat=args.repeat, console=console)
+    if args.baseline is None or args.update_baseline or not args.baseline.exists():
+        console.print(compare(current, None, threshold=args.threshold)[0])
+        if args.baseline is not None:
+            args.baseline.parent.mkdir(parents=True, exist_ok=True)
+            args.baseline.write_text(json.dumps(current, indent=2) + "\n")
+            console.log(f"Stored the results as the baseline, in [blue]{args.baseline}")
+        return
+
+    baseline = json.loads(args.baseline.read_text())
+    table, regressions = compare(current, baseline, threshold=args.threshold)
+    console.print(table)
+    if regressions:
+        raise SystemExit("Regressions:\n" + "\n".join(f"  {r}" for r in regressions))
+    console.log("[green]No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""Measure how long each phase of bootstrapping pip takes, with the public files.
+
+Every available interpreter runs the get-pip.py that is meant for it (and
+public/pip.pyz, where it is supported), installing pip from a local index into
+a temporary directory. The size of every file, which is what is downloaded, and
+the time taken by every phase of the run are recorded:
+
+- compile: reading and compiling the script.
+- module: running the script's module body (its version check and imports).
+- decode: decoding the payload, in whichever encoding the script embeds, and
+  decompressing it, for scripts with a solid (tar.xz) payload.
+- write: writing the decoded zip file to a temporary directory. Scripts that
+  stream the payload into the file as it is decoded, or that unpack it, report
+  this as decode.
+- import: importing pip, from the zip file or the unpacked files. Scripts that
+  can install pip without running it do not import it, and skip this.
+- install: running `pip install`, against the local index, or installing pip
+  without it.
+- interpreter: the rest of the process's lifetime, i.e. starting up and
+  shutting down the interpreter.
+
+Usage: python scripts/benchmark_bootstrap.py --wheel-dir DIR [--output PATH]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from index_server import Index, IndexServer
+from rich.console import Console
+from rich.table import Table
+
+PHASES = ["compile", "module", "decode", "write", "import", "install", "interpreter"]
+
+# The interpreters that are looked for on PATH, when none are given.
+CANDIDATE_PYTHONS = ["python2.7"] + [f"python3.{minor}" for minor in range(6, 16)]
+
+# Run by every interpreter, so this has to work on Python 2.7 too. It is given
+# the kind of file ("script" or "zipapp"), its path, where to write the
+# timings, and the arguments to pass on to `pip install`.
+PROBE = r"""
+import json, os, runpy, sys, tempfile, time
+
+clock = getattr(time, "perf_counter", time.time)
+kind, path, output = sys.argv[1:4]
+pip_args = sys.argv[4:]
+phases = {}
+status = None
+started = last = clock()
+
+
+def lap(name):
+    global last
+    now = clock()
+    phases[name] = now - last
+    last = now
+
+
+tmpdir = tempfile.mkdtemp()
+try:
+    if kind == "script":
+        with open(path, "rb") as f:
+            code = compile(f.read(), path, "exec")
+        lap("compile")
+        namespace = {"__name__": "get_pip", "__file__": path}
+        exec(code, namespace)
+        lap("module")
+        pip_zip = os.path.join(tmpdir, "pip.zip")
+        if namespace.get("PAYLOAD_FORMAT", "zip") != "zip":
+            # The payload is unpacked as it is decoded, so this times both.
+            pip_zip = os.path.join(tmpdir, "pip")
+            namespace["unpack_payload"](pip_zip)
+            lap("decode")
+        elif "iter_payload" in namespace:
+            # The payload is decoded as it is written, so this times both.
+            with open(pip_zip, "wb") as f:
+                for chunk in namespace["iter_payload"]():
+                    f.write(chunk)
+            lap("decode")
+        else:
+            data = namespace["b85decode"](namespace["DATA"].replace(b"\n", b""))
+            lap("decode")
+            with open(pip_zip, "wb") as f:
+                f.write(data)
+            lap("write")
+        sys.path.insert(0, pip_zip)
+    else:
+        sys.path.insert(0, path)
+
+    if kind != "script" or "install_without_pip" not in namespace:
+        import pip
+        try:
+            import pip._internal.cli.main
+        except ImportError:
+            pass
+        lap("import")
+
+    try:
+        if kind == "script":
+            sys.argv = [path] + pip_args
+            if "build_wheel" in namespace:
+                # pip can be installed from the wheel that is rebuilt from here.
+                namespace["bootstrap"](tmpdir=tmpdir, pip_path=pip_zip)
+            else:
+                namespace["bootstrap"](tmpdir=tmpdir)
+        else:
+            sys.argv = [path, "install"] + pip_args
+            runpy.run_module("pip", run_name="__main__")
+    except SystemExit as exc:
+        status = exc.code
+    lap("install")
+finally:
+    with open(output, "w") as f:
+        json.dump({"phases": phases, "total": clock() - started, "status": status}, f)
+"""
+
+
+def find_interpreters(names: List[str]) -> Iterator[Tuple[str, Tuple[int, int], str]]:
+    """Yield the (executable, version, full version) of every working interpreter."""
+    for name in names:
+        executable = shutil.which(name)
+        if executable is None:
+            continue
+        result = subprocess.run(
+            [executable, "-c", "import platform; print(platform.python_version())"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        )
+        if result.returncode != 0:
+            # e.g. a pyenv shim, for a version that is not installed.
+            continue
+        full_version = result.stdout.strip()
+        major, minor = map(int, full_version.split(".")[:2])
+        yield executable, (major, minor), full_version
+
+
+def script_for(public: Path, version: Tuple[int, int]) -> Path:
+    """The get-pip.py that users of a Python version are pointed to."""
+    specific = public / f"{version[0]}.{version[1]}" / "get-pip.py"
+    return specific if specific.exists() else public / "get-pip.py"
+
+
+def script_pip_version(script: Path) -> str:
+    with script.open(encoding="utf-8") as f:
+        match = re.search(r"entire copy of pip \(version (\S+)\)", f.read(2048))
+    assert match, f"{script} does not say which version of pip it contains"
+    return match.group(1)
+
+
+def zipapp_info(zipapp: Path) -> Tuple[str, Tuple[int, int]]:
+    """The version of pip in a zipapp, and the lowest Python version it supports."""
+    with zipfile.ZipFile(zipapp) as zf:
+        main = zf.read("__main__.py").decode("utf-8")
+        init = zf.read("pip/__init__.py").decode("utf-8")
+    requires = re.search(r"PYTHON_REQUIRES = \((\d+), (\d+)\)", main)
+    version = re.search(r"__version__ = \"([^\"]+)\"", init)
+    assert requires and version, f"{zipapp} is not a pip zipapp"
+    return version.group(1), (int(requires.group(1)), int(requires.group(2)))
+
+
+def probe_env() -> Dict[str, str]:
+    """The environment to run get-pip.py in, free of the user's pip settings."""
+    env = {
+        key: value for key, value in os.environ.items() if not key.startswith("PIP_")
+    }
+    env["PIP_NO_CACHE_DIR"] = "1"
+    env["PIP_DISABLE_PIP_VERSION_CHECK"] = "1"
+    return env
+
+
+def run_probe(
+    python: str, kind: str, path: Path, *, index_url: str, repeat: int
+) -> Dict[str, float]:
+    """Bootstrap pip `repeat` times, returning the lowest time taken per phase."""
+    timings: Dict[str, List[float]] = {}
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as workdir:
+            output = Path(workdir, "timings.json")
+            pip_args = [
+                "--index-url",
+                index_url,
+                "--target",
+                str(Path(workdir, "target")),
+                "--no-setuptools",
+                "--no-wheel",
+            ]
+            if kind == "zipapp":
+                # These are only understood by get-pip.py.
+                pip_args = pip_args[:-2] + ["pip"]
+
+            start = time.perf_counter()
+            process = subprocess.run(
+                [python, "-c", PROBE, kind, str(path.resolve()), str(output)]
+                + pip_args,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                env=probe_env(),
+                cwd=workdir,
+            )
+            wall = time.perf_counter() - start
+
+            result = json.loads(output.read_text()) if output.exists() else None
+            if process.returncode != 0 or result is None or result["status"]:
+                raise RuntimeError(
+                    f"{python} {path} failed:\n"
+                    + process.stdout.decode("utf-8", "replace")
+                )
+
+        phases = dict(result["phases"], interpreter=wall - result["total"])
+        for phase, seconds in phases.items():
+            timings.setdefault(phase, []).append(seconds)
+
+    return {phase: min(seconds) for phase, seconds in timings.items()}
+
+
+def run_all(
+    public: Path,
+    pythons: List[str],
+    *,
+    index_url: str,
+    repeat: int,
+    console: Console,
+) -> List[Dict[str, Any]]:
+    zipapp = public / "pip.pyz"
+    zipapp_version, zipapp_requires = zipapp_info(zipapp)
+
+    results = []
+    for executable, version, full_version in find_interpreters(pythons):
+        runs = [("script", script_for(public, version))]
+        if version >= zipapp_requires:
+            runs.append(("zipapp", zipapp))
+
+        for kind, path in runs:
+            if kind == "script":
+                pip_version = script_pip_version(path)
+            else:
+                pip_version = zipapp_version
+            console.log(
+                f"Bootstrapping [green]pip {pip_version}[reset] with "
+                f"[blue]{path}[reset], on [magenta]Python {full_version}"
+            )
+            phases = run_probe(
+                executable, kind, path, index_url=index_url, repeat=repeat
+            )
+            results.append(
+                {
+                    "python": full_version,
+                    "file": path.relative_to(public).as_posix(),
+                    "pip_version": pip_version,
+                    "size": path.stat().st_size,
+                    "phases": phases,
+                    "total": sum(phases.values()),
+                }
+            )
+    return results
+
+
+def report(
+    results: List[Dict[str, Any]], previous: Optional[List[Dict[str, Any]]]
+) -> Table:
+    """Tabulate the results, with the change from `previous` results, if given."""
+    earlier = {(result["python"], result["file"]): result for result in previous or []}
+
+    table = Table(title="Time taken per bootstrap phase, in ms")
+    table.add_column("Python")
+    table.add_column("File")
+    table.add_column("pip")
+    table.add_column("Size", justify="right")
+    for phase in PHASES:
+        table.add_column(phase.capitalize(), justify="right")
+    table.add_column("Total", justify="right")
+    if previous is not None:
+        table.add_column("Change", justify="right")
+
+    for result in results:
+        cells = [result["python"], result["file"], result["pip_version"]]
+        cells.append(f"{result['size'] / 1024:,.0f} KiB")
+        for phase in PHASES:
+            seconds = result["phases"].get(phase)
+            cells.append("-" if seconds is None else f"{seconds * 1000:.0f}")
+        cells.append(f"{result['total'] * 1000:.0f}")
+
+        if previous is not None:
+            before = earlier.get((result["python"], result["file"]))
+            if before is None:
+                cells.append("-")
+            else:
+                change = result["total"] / before["total"] - 1
+                cells.append(f"{change:+.0%} (pip {before['pip_version']})")
+        table.add_row(*cells)
+
+    return table
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    index = parser.add_mutually_exclusive_group(required=True)
+    index.add_argument(
+        "--wheel-dir",
+        type=Path,
+        metavar="DIR",
+        help="serve the wheels in DIR, through a local index",
+    )
+    index.add_argument(
+        "--index-url", metavar="URL", help="use an index that is already running"
+    )
+    parser.add_argument(
+        "--python",
+        action="append",
+        metavar="PYTHON",
+        help="an interpreter to run with (default: every Python on PATH)",
+    )
+    parser.add_argument("--public", type=Path, default=Path("public"), metavar="DIR")
+    parser.add_argument("--repeat", type=int, default=3, metavar="N")
+    parser.add_argument(
+        "--output", type=Path, metavar="PATH", help="store the results in PATH"
+    )
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        metavar="PATH",
+        help="compare against the results stored in PATH, by an earlier run",
+    )
+    args = parser.parse_args()
+
+    console = Console()
+    server = None
+    index_url = args.index_url
+    if args.wheel_dir is not None:
+        server = IndexServer(("127.0.0.1", 0), Index(args.wheel_dir), quiet=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        index_url = server.url
+        console.log(f"Serving [blue]{args.wheel_dir}[reset] at {index_url}")
+
+    try:
+        results = run_all(
+            args.public,
+            args.python or CANDIDATE_PYTHONS,
+            index_url=index_url,
+            repeat=args.repeat,
+            console=console,
+        )
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    previous = None
+    if args.compare is not None:
+        previous = json.loads(args.compare.read_text())["results"]
+    console.print(report(results, previous))
+
+    if args.output is not None:
+        args.output.write_text(json.dumps({"results": results}, indent=2) + "\n")
+        console.log(f"Stored the results in [blue]{args.output}")
+
+
+if __name__ == "__main__":
+    main()
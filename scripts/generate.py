@@ -1,24 +1,66 @@
 """Update all the get-pip.py scripts."""
+import argparse
+import base64
+import calendar
+import collections
+import contextlib
+import dis
 import hashlib
 import io
 import itertools
+import json
+import mmap
 import operator
+import os
 import re
 import shutil
-from base64 import b85encode
-from functools import lru_cache
+import struct
+import sys
+import tarfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import cached_property, lru_cache
 from io import BytesIO
 from pathlib import Path
-from typing import Dict, Iterable, List, TextIO, Tuple
-from zipfile import ZipFile, ZipInfo
+from types import CodeType
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    TextIO,
+    Tuple,
+    Union,
+)
+from urllib.parse import urljoin, urlparse
+from zipfile import ZIP64_LIMIT, ZIP_LZMA, ZIP_STORED, ZipFile, ZipInfo
 
 import requests
-from cachecontrol import CacheControl
-from cachecontrol.caches.file_cache import FileCache
+from packaging.requirements import Requirement
 from packaging.specifiers import SpecifierSet
+from packaging.utils import canonicalize_name, parse_wheel_filename
 from packaging.version import Version
 from pkg_metadata import bytes_to_json
+from requests.adapters import HTTPAdapter
 from rich.console import Console
+from rich.table import Table
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+try:
+    import resource
+except ImportError:  # pragma: no cover (Windows)
+    resource = None
 
 SCRIPT_CONSTRAINTS = {
     "default": {
@@ -78,6 +120,10 @@ SCRIPT_CONSTRAINTS = {
     },
 }
 
+# Releases of pip are discovered through PyPI's JSON simple API (PEP 691).
+DEFAULT_INDEX_URL = "https://pypi.org/simple/"
+SIMPLE_API_CONTENT_TYPE = "application/vnd.pypi.simple.v1+json"
+
 # This is the oldest version of pip we will distribute as a zipapp.
 # Pip 22.3 was the first pip to support being shipped as a zipapp,
 # but we may in future choose to increase this value to stop shipping
@@ -103,31 +149,593 @@ OLDEST_ZIPAPP = Version("22.3")
 # This is useful when restructuring this repository, like what we did in early 2021.
 MOVED_SCRIPTS: Dict[str, str] = {}
 
+# templates/default.py gets the .dist-info of pip too, under this directory in the
+# payload, where it is not found by anything that imports pip from there.
+METADATA_PREFIX = "_metadata/"
+
+# The "full" scripts (get-pip-full.py) also have wheels of these projects, and of
+# everything they require, in their payload, under WHEELHOUSE_PREFIX, so that
+# everything they install can be installed without an index.
+BUNDLED_PROJECTS = ["setuptools", "wheel"]
+WHEELHOUSE_PREFIX = "_wheelhouse/"
+
+# The markers of the bundled wheels' requirements are evaluated on these platforms
+# (as sys.platform, os.name and platform.system()), and on every Python that a
+# script is for: the default one is for every Python up to NEWEST_PYTHON.
+MARKER_PLATFORMS = [
+    ("linux", "posix", "Linux"),
+    ("darwin", "posix", "Darwin"),
+    ("win32", "nt", "Windows"),
+]
+NEWEST_PYTHON = (3, 14)
+
+# The formats that the payload of a script can be in. A zip file is what pip can be
+# imported from directly, and what every template supports. A tarball that is
+# compressed as a whole with xz is about 40% smaller, as it compresses across
+# files, but it has to be unpacked before pip can be imported from it, and only
+# templates/default.py can do that. xz's default preset compresses the payload
+# as well as its highest one does, and needs much less memory (9 MiB, rather than
+# 65 MiB) to decompress it.
+PAYLOAD_FORMATS = ["zip", "tar.xz"]
+XZ_PRESET = 6
+
+# Wheels are streamed in chunks of this size, so that they can be hashed as they
+# arrive.
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Wheels are held in memory as bytes, or mapped into memory from the wheel store.
+Buffer = Union[bytes, mmap.mmap]
+
+# Base85 payloads are wrapped into lines of this length.
+B85_ALPHABET = (
+    b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    b"abcdefghijklmnopqrstuvwxyz!#$%&()*+-;<=>?@^_`{|}~"
+)
+PAYLOAD_LINE_LENGTH = 79
+B85_CHARS = [bytes((c,)) for c in B85_ALPHABET]
+B85_CHARS2 = [a + b for a in B85_CHARS for b in B85_CHARS]
+
+# Every 4 bytes encode to 5 characters, so 316 bytes encode to exactly 5 lines of
+# base85, and 57 bytes encode to exactly one 76 character line of base64.
+# Payloads are encoded in blocks of a multiple of those sizes, which can then be
+# wrapped independently of each other. This also means that every line but the
+# last is full, which templates/default.py relies on to decode the payload in
+# chunks of whole lines.
+ENCODE_BLOCK_SIZES = {"base85": 316 * 1024, "base64": 57 * 5 * 1024}
+
+# Records what every file in public/ was generated from, so that reruns only
+# regenerate the files whose inputs have changed. Like the cache, it describes
+# one checkout's public/, so it is not committed (see .gitignore).
+MANIFEST_PATH = Path(".generate-manifest.json")
+
+# The filename and extra field lengths, at offset 26 of a zip's local file header.
+LOCAL_HEADER_LENGTHS = struct.Struct("<HH")
+
+
+def current_rss() -> Optional[int]:
+    """The resident set size of this process, in bytes, where /proc has it."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except OSError:
+        return None
+
+
+def peak_rss() -> int:
+    """The peak resident set size, in bytes, of this process or of any of its
+    finished child processes."""
+    assert resource is not None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # This is in bytes on macOS, and in KiB everywhere else.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def code_lines(code: CodeType) -> Iterator[int]:
+    """The lines of `code`, and of the functions and comprehensions within it."""
+    for _, line in dis.findlinestarts(code):
+        if line is not None:
+            yield line
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            yield from code_lines(const)
+
+
+class MemoryTracker:
+    """Charges every open span with the peak memory used while it was open.
+
+    Python allocations are traced with tracemalloc, and the RSS of the process
+    is read too, where it is available. Both are sampled every `interval`
+    seconds, and whenever a span starts or ends. The traced peak is reset at
+    every sample, so that allocations which come and go between two samples
+    are still accounted for.
+
+    The samples are packed into anonymous memory maps, which tracemalloc does
+    not trace, so that keeping them does not add to the memory that is being
+    measured. They only become trace events in `counter_events()`.
+    """
+
+    SNAPSHOT_GROWTH = 1024 * 1024
+    # The time (in microseconds), traced memory and RSS of a sample.
+    SAMPLE = struct.Struct("<dqq")
+    SAMPLES_PER_BUFFER = 64 * 1024
+
+    def __init__(self, *, interval: float = 0.01, top: int = 10):
+        self.interval = interval
+        self.top = top
+        self._lock = threading.Lock()
+        self._open: Dict[int, Dict[str, Optional[int]]] = {}
+        self._stage_peaks: Dict[str, int] = {}
+        self._buffers: List[mmap.mmap] = []
+        self._samples = 0
+        # The lines of the tracer itself, which holds the spans and the
+        # allocation sites recorded for them, are not reported as sites.
+        self._own_lines = {
+            line
+            for cls in (MemoryTracker, Tracer)
+            for function in vars(cls).values()
+            if hasattr(function, "__code__")
+            for line in code_lines(getattr(function, "__wrapped__", function).__code__)
+        }
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        tracemalloc.start()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+        tracemalloc.stop()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        with self._lock:
+            _, traced = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            rss = current_rss()
+            for usage in self._open.values():
+                usage["traced"] = max(usage["traced"] or 0, traced)
+                if rss is not None:
+                    usage["rss"] = max(usage["rss"] or 0, rss)
+            index = self._samples % self.SAMPLES_PER_BUFFER
+            if index == 0:
+                size = self.SAMPLE.size * self.SAMPLES_PER_BUFFER
+                self._buffers.append(mmap.mmap(-1, size))
+            self.SAMPLE.pack_into(
+                self._buffers[-1],
+                index * self.SAMPLE.size,
+                time.perf_counter_ns() / 1000,
+                traced,
+                rss or 0,
+            )
+            self._samples += 1
+
+    def counter_events(self) -> List[Dict[str, Any]]:
+        """Take the samples so far, as counters that trace viewers draw as graphs."""
+        with self._lock:
+            buffers, samples = self._buffers, self._samples
+            self._buffers, self._samples = [], 0
+        events = []
+        for sample in range(samples):
+            buffer, index = divmod(sample, self.SAMPLES_PER_BUFFER)
+            ts, traced, rss = self.SAMPLE.unpack_from(
+                buffers[buffer], index * self.SAMPLE.size
+            )
+            events.append(
+                {
+                    "name": "memory",
+                    "ph": "C",
+                    "ts": ts,
+                    "pid": os.getpid(),
+                    "args": {"traced": traced, "rss": rss},
+                }
+            )
+        for buffer in buffers:
+            buffer.close()
+        return events
+
+    def top_allocations(self) -> List[Dict[str, Any]]:
+        """The lines that hold the most memory that is still allocated."""
+        # Filtering the statistics is much faster than filtering the snapshot.
+        ignored = {
+            tracemalloc.__file__,
+            "<frozen importlib._bootstrap>",
+            "<frozen importlib._bootstrap_external>",
+            "<unknown>",
+        }
+        stats = tracemalloc.take_snapshot().statistics("lineno")
+        return [
+            {
+                "site": f"{frame.filename}:{frame.lineno}",
+                "size_bytes": stat.size,
+                "count": stat.count,
+            }
+            for stat in stats
+            for frame in [stat.traceback[0]]
+            if frame.filename not in ignored
+            and not (frame.filename == __file__ and frame.lineno in self._own_lines)
+        ][: self.top]
+
+    @contextlib.contextmanager
+    def track(self, name: str) -> Iterator[Dict[str, Any]]:
+        """Measure the memory used within this block, into the yielded dict.
+
+        Taking a snapshot of the largest allocation sites is slow, so they are
+        only recorded when a span raises the peak of its stage by at least
+        `SNAPSHOT_GROWTH`.
+        """
+        result: Dict[str, Any] = {}
+        usage: Dict[str, Optional[int]] = {"traced": None, "rss": None}
+        self.sample()
+        with self._lock:
+            self._open[id(usage)] = usage
+        try:
+            yield result
+        finally:
+            self.sample()
+            with self._lock:
+                del self._open[id(usage)]
+            result["peak_traced_bytes"] = usage["traced"]
+            result["peak_rss_bytes"] = usage["rss"]
+            traced = usage["traced"] or 0
+            previous = self._stage_peaks.get(name)
+            if previous is None or traced > previous + self.SNAPSHOT_GROWTH:
+                self._stage_peaks[name] = traced
+                result["top_allocations"] = self.top_allocations()
+
+
+class Tracer:
+    """Records how long each stage of the generator takes, as a list of spans.
+
+    Spans are kept as Chrome trace events, so that they can be loaded into
+    chrome://tracing or https://ui.perfetto.dev as they are. Once
+    `track_memory()` is called, spans record their peak memory use too.
+    """
 
-def get_all_pip_versions() -> Dict[Version, Tuple[str, str]]:
-    data = requests.get("https://pypi.python.org/pypi/pip/json").json()
+    def __init__(self) -> None:
+        self.events: List[Dict[str, Any]] = []
+        self.memory: Optional[MemoryTracker] = None
+
+    def track_memory(self) -> None:
+        self.memory = MemoryTracker()
+        self.memory.start()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args: Any) -> Iterator[None]:
+        labels = {key: str(value) for key, value in args.items()}
+        memory = self.memory.track(name) if self.memory else contextlib.nullcontext({})
+        # Measuring memory takes time, which is kept out of the span's duration.
+        with memory as usage:
+            start = time.perf_counter_ns()
+            try:
+                yield
+            finally:
+                end = time.perf_counter_ns()
+        self.events.append(
+            {
+                "name": name,
+                "ph": "X",
+                "ts": start / 1000,
+                "dur": (end - start) / 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": {**labels, **usage},
+            }
+        )
 
-    versions = sorted(Version(s) for s in data["releases"].keys())
+    def summary(self) -> Dict[str, Any]:
+        """Total up the time spent in each stage, alongside every span.
 
-    retval = {}
-    for version in versions:
-        wheels = [
-            (file["url"], file["digests"]["sha256"])
-            for file in data["releases"][str(version)]
-            if file["url"].endswith(".whl")
+        When memory is tracked, each stage also has the highest peak of any of
+        its spans, and the largest allocation sites within that span.
+        """
+        spans = sorted(
+            (event for event in self.events if event["ph"] == "X"),
+            key=operator.itemgetter("ts"),
+        )
+
+        stages: Dict[str, Dict[str, Any]] = {}
+        for event in spans:
+            stage = stages.setdefault(
+                event["name"], {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            )
+            seconds = event["dur"] / 1_000_000
+            stage["count"] += 1
+            stage["total_seconds"] += seconds
+            stage["max_seconds"] = max(stage["max_seconds"], seconds)
+
+            if "peak_traced_bytes" not in event["args"]:
+                continue
+            traced = event["args"]["peak_traced_bytes"] or 0
+            if traced >= stage.get("peak_traced_bytes", 0):
+                stage["peak_traced_bytes"] = traced
+                if "top_allocations" in event["args"]:
+                    stage["top_allocations"] = event["args"]["top_allocations"]
+            rss = event["args"]["peak_rss_bytes"]
+            if rss is not None:
+                stage["peak_rss_bytes"] = max(stage.get("peak_rss_bytes", 0), rss)
+
+        return {
+            "stages": stages,
+            "spans": [
+                {
+                    "name": event["name"],
+                    "seconds": event["dur"] / 1_000_000,
+                    **{
+                        key: value
+                        for key, value in event["args"].items()
+                        if key != "top_allocations"
+                    },
+                }
+                for event in spans
+            ],
+        }
+
+    def write_trace(self, path: Path) -> None:
+        # Name the processes, so that the parent can be told apart from workers.
+        pids = sorted({event["pid"] for event in self.events})
+        metadata = [
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": pid,
+                "args": {"name": "generate.py" if pid == os.getpid() else "worker"},
+            }
+            for pid in pids
         ]
-        if not wheels:
-            continue
+        trace = {"traceEvents": metadata + self.events, "displayTimeUnit": "ms"}
+        path.write_text(json.dumps(trace), encoding="utf-8")
+
+
+TRACER = Tracer()
+
+
+def get_all_wheels(
+    project: str, *, cache_dir: Path, index_url: str = DEFAULT_INDEX_URL
+) -> Dict[str, Dict[str, Any]]:
+    """Get the version, url, sha256 and Requires-Python of every wheel of `project`.
+
+    The index is fetched from the JSON simple API (PEP 691) at `index_url`, and
+    the wheels found in it are kept in `cache_dir`. Later runs revalidate the
+    cached index with a conditional request, and when it has changed, only the
+    filenames of the wheels that have not been seen before are parsed. Everything
+    else, like whether a wheel is yanked, comes from the new response. Wheels are
+    keyed by their filename.
+    """
+    project_index_url = urljoin(index_url, f"{project}/")
+    index_path = cache_dir / f"{project}-index.json"
+    cached = {
+        "url": project_index_url,
+        "etag": None,
+        "last_modified": None,
+        "wheels": {},
+    }
+    if index_path.exists():
+        stored = json.loads(index_path.read_text(encoding="utf-8"))
+        if stored.get("url") == project_index_url:
+            cached = stored
+
+    headers = {"Accept": SIMPLE_API_CONTENT_TYPE}
+    if cached["etag"]:
+        headers["If-None-Match"] = cached["etag"]
+    if cached["last_modified"]:
+        headers["If-Modified-Since"] = cached["last_modified"]
+    response = requests.get(project_index_url, headers=headers)
+    response.raise_for_status()
+
+    if response.status_code != 304:
+        content_type = response.headers.get("Content-Type", "")
+        if content_type.split(";")[0].strip() != SIMPLE_API_CONTENT_TYPE:
+            raise SystemExit(
+                f"{project_index_url} returned {content_type or 'no Content-Type'}, "
+                f"rather than {SIMPLE_API_CONTENT_TYPE}: the index must support "
+                f"the JSON simple API (PEP 691)"
+            )
+        wheels = {}
+        for file in response.json()["files"]:
+            filename = file["filename"]
+            if not filename.endswith(".whl"):
+                continue
+            # Only the version is reused, as parsing every filename again is
+            # slow. Whether a wheel is yanked, and what Python it requires, can
+            # change after it has been seen, so they are always refreshed.
+            if filename in cached["wheels"]:
+                version = cached["wheels"][filename]["version"]
+            else:
+                version = str(parse_wheel_filename(filename)[1])
+            wheels[filename] = {
+                "version": version,
+                "url": urljoin(response.url, file["url"]),
+                "sha256": file["hashes"]["sha256"],
+                "requires_python": file.get("requires-python"),
+                "yanked": bool(file.get("yanked")),
+            }
+
+        cached = {
+            "url": project_index_url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "wheels": wheels,
+        }
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_open(index_path, "w", encoding="utf-8") as f:
+            json.dump(cached, f, indent=2)
+
+    return cached["wheels"]
+
+
+def get_all_pip_versions(
+    *, cache_dir: Path, index_url: str = DEFAULT_INDEX_URL
+) -> Dict[Version, Tuple[str, str]]:
+    """Get the (url, sha256) of the wheel of every pip release."""
+    wheels = get_all_wheels("pip", cache_dir=cache_dir, index_url=index_url)
+    releases = collections.defaultdict(list)
+    for wheel in wheels.values():
+        releases[Version(wheel["version"])].append((wheel["url"], wheel["sha256"]))
+
+    retval = {}
+    for version in sorted(releases):
+        wheels = releases[version]
         assert len(wheels) == 1, (version, wheels)
         retval[version] = wheels[0]
     return retval
 
 
+def read_lockfile(path: Path) -> Dict[Version, Tuple[str, str]]:
+    """Get the (url, sha256) of the wheel of every pip release, from a lockfile."""
+    lockfile = json.loads(path.read_text(encoding="utf-8"))
+
+    retval = {}
+    for wheel in lockfile["pip"]:
+        # Without a URL, the wheel can only be found by name in a --wheel-dir.
+        url = wheel.get("url", wheel["filename"])
+        retval[Version(wheel["version"])] = (url, wheel["sha256"])
+    return dict(sorted(retval.items()))
+
+
+def write_lockfile(path: Path, pip_versions: Dict[Version, Tuple[str, str]]) -> None:
+    wheels = [
+        {
+            "version": str(version),
+            "filename": Path(urlparse(url).path).name,
+            "sha256": sha256,
+            "url": url,
+        }
+        for version, (url, sha256) in sorted(pip_versions.items())
+    ]
+    with atomic_open(path, "w", encoding="utf-8", newline="\n") as f:
+        json.dump({"pip": wheels}, f, indent=2)
+        f.write("\n")
+
+
+def required_pip_versions(pip_versions: Iterable[Version]) -> Set[Version]:
+    """The versions of pip whose wheels are needed to generate public/."""
+    pip_versions = sorted(pip_versions)
+    required = {v for v in pip_versions if v >= OLDEST_ZIPAPP}
+    for _, mapping in populated_script_constraints(SCRIPT_CONSTRAINTS):
+        required.add(determine_latest(pip_versions, constraint=mapping["pip"]))
+    return required
+
+
 def determine_latest(versions: Iterable[Version], *, constraint: str):
     assert sorted(versions) == list(versions)
     return list(SpecifierSet(constraint).filter(versions))[-1]
 
 
+def determine_bundled_wheel(
+    project: str, wheels: Dict[str, Dict[str, Any]], *, constraint: str, python: str
+) -> Tuple[str, str, str]:
+    """Pick the wheel of `project` to bundle into a full script.
+
+    This is the newest release that satisfies `constraint`, with a pure Python 3
+    wheel that supports `python` (the oldest Python that the script is for).
+    Returns its (filename, url, sha256).
+    """
+    candidates = {}
+    for filename, wheel in wheels.items():
+        _, version, _, tags = parse_wheel_filename(filename)
+        requires_python = SpecifierSet(wheel["requires_python"] or "")
+        if wheel["yanked"] or python not in requires_python:
+            continue
+        if any(tag.interpreter == "py3" and tag.platform == "any" for tag in tags):
+            candidates[version] = (filename, wheel["url"], wheel["sha256"])
+    if not list(SpecifierSet(constraint).filter(candidates)):
+        raise SystemExit(
+            f"No pure Python wheel of {project}{constraint} supports Python {python}"
+        )
+    return candidates[determine_latest(sorted(candidates), constraint=constraint)]
+
+
+def read_requirements(wheel: Path) -> List[Requirement]:
+    """Read the Requires-Dist of a wheel, from its .dist-info/METADATA.
+
+    Only the wheel's own .dist-info is looked at, not those of anything that it
+    vendors.
+    """
+    with ZipFile(wheel) as zf:
+        for name in zf.namelist():
+            directory, _, filename = name.partition("/")
+            if directory.endswith(".dist-info") and filename == "METADATA":
+                data = bytes_to_json(zf.read(name))
+                return [Requirement(r) for r in data.get("requires_dist", [])]
+    raise SystemExit(f"{wheel} has no .dist-info/METADATA")
+
+
+def requirement_applies(requirement: Requirement, pythons: Iterable[str]) -> bool:
+    """Whether `requirement` applies on any of `pythons`, without any extras."""
+    if requirement.marker is None:
+        return True
+    return any(
+        requirement.marker.evaluate(
+            {
+                "extra": "",
+                "python_version": python,
+                "python_full_version": f"{python}.0",
+                "sys_platform": sys_platform,
+                "os_name": os_name,
+                "platform_system": platform_system,
+            }
+        )
+        for python in pythons
+        for sys_platform, os_name, platform_system in MARKER_PLATFORMS
+    )
+
+
+def determine_bundled_wheels(
+    mapping: Dict[str, str],
+    *,
+    pip_version: Version,
+    pythons: List[str],
+    get_wheels: Callable[[str], Dict[str, Dict[str, Any]]],
+    get_requirements: Callable[[str, str], List[Requirement]],
+) -> Dict[str, Tuple[str, str, str]]:
+    """Pick the wheels to bundle into a full script, for the given `pythons`.
+
+    These are BUNDLED_PROJECTS, as constrained by `mapping`, and everything they
+    require, recursively, on any of `pythons`. Each project is picked once, with
+    `determine_bundled_wheel()`, for the first requirement on it. Generation fails
+    if a later requirement is not satisfied by that pick (or by the script's pip),
+    or if a project has no pure Python wheel, since the script could not install
+    it without the index. `get_wheels` gets the wheels of a project, and
+    `get_requirements` the requirements of the (url, sha256) of a wheel. Returns
+    the (filename, url, sha256) of each wheel, keyed by project name.
+    """
+    versions = {"pip": pip_version}
+    picked = {}
+    pending = [
+        (project, mapping[project], "get-pip.py") for project in BUNDLED_PROJECTS
+    ]
+    while pending:
+        project, constraint, required_by = pending.pop(0)
+        name = canonicalize_name(project)
+        if name in versions:
+            if not SpecifierSet(constraint).contains(versions[name], prereleases=True):
+                raise SystemExit(
+                    f"{required_by} requires {project}{constraint}, "
+                    f"but {name} {versions[name]} is bundled"
+                )
+            continue
+        filename, url, sha256 = determine_bundled_wheel(
+            name, get_wheels(name), constraint=constraint, python=pythons[0]
+        )
+        versions[name] = parse_wheel_filename(filename)[1]
+        picked[name] = (filename, url, sha256)
+        for requirement in get_requirements(url, sha256):
+            if not requirement_applies(requirement, pythons):
+                continue
+            if requirement.extras:
+                raise SystemExit(f"{filename} requires {requirement}, with extras")
+            pending.append((requirement.name, str(requirement.specifier), filename))
+    return picked
+
+
 @lru_cache
 def get_ordered_templates() -> List[Tuple[Version, Path]]:
     """Get an ordered list of templates, based on the max version they support.
@@ -161,6 +769,19 @@ def get_ordered_templates() -> List[Tuple[Version, Path]]:
     return sorted(ordered_templates, key=operator.itemgetter(0))
 
 
+def determine_payload_codec(template: Path) -> str:
+    """Pick the encoding of the payload of a script that is rendered from `template`.
+
+    Base64 makes the payload about 6.7% larger than base85 does (2.34MB instead of
+    2.19MB, for pip 26.0.1), but it is decoded in C by `binascii.a2b_base64()`,
+    which also skips the newlines itself. That takes 5-12ms on Python 3.6-3.13,
+    where `base64.b85decode()`, in pure Python, takes 280-520ms. Compressed for
+    transfer, base64 is slightly smaller than base85. Only templates/default.py
+    can decode anything but base85, though.
+    """
+    return "base64" if template.name == "default.py" else "base85"
+
+
 def determine_template(version: Version):
     ordered_templates = get_ordered_templates()
     for template_version, template in ordered_templates:
@@ -171,18 +792,137 @@ def determine_template(version: Version):
         return template
 
 
-def download_wheel(url: str, expected_sha256: str) -> bytes:
+class WheelStore:
+    """A local store of wheels, addressed by their sha256.
+
+    Wheels are only looked up by digest, so a hit never needs to go over HTTP.
+    A stored wheel is verified against its digest the first time it is used in
+    a run, rather than up front. Once the store grows past `max_size` bytes, the
+    least recently used wheels are evicted.
+    """
+
+    def __init__(self, root: Path, *, max_size: int) -> None:
+        self.root = root
+        self.max_size = max_size
+        self._verified: Set[str] = set()
+
+    def path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / f"{sha256}.whl"
+
+    def get(self, sha256: str) -> Optional[Path]:
+        """Get the path of the stored wheel, or None if it is not stored (intact)."""
+        path = self.path(sha256)
+        try:
+            # Mark the wheel as recently used.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        if sha256 not in self._verified:
+            with path.open("rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    digest = hashlib.sha256(data).hexdigest()
+            if digest != sha256:
+                path.unlink()
+                return None
+            self._verified.add(sha256)
+        return path
+
+    def add(self, sha256: str, chunks: Iterable[bytes]) -> Path:
+        """Store the wheel made up of `chunks`, checking that it matches `sha256`."""
+        path = self.path(sha256)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Hash the wheel as it is written, rather than reading it back.
+        hashobj = hashlib.sha256()
+        with atomic_open(path, "wb") as f:
+            for chunk in chunks:
+                hashobj.update(chunk)
+                f.write(chunk)
+            assert hashobj.hexdigest() == sha256, (path.name, hashobj.hexdigest())
+
+        self._verified.add(sha256)
+        return path
+
+    def evict(self) -> List[Path]:
+        """Remove the least recently used wheels, until the store fits `max_size`.
+
+        Returns the paths of the wheels that were removed.
+        """
+        stored = []
+        for path in self.root.glob("*/*.whl"):
+            stat = path.stat()
+            stored.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in stored)
+        evicted = []
+        for _, size, path in sorted(stored):
+            if total <= self.max_size:
+                break
+            path.unlink()
+            total -= size
+            evicted.append(path)
+        return evicted
+
+
+def create_session(pool_size: int) -> requests.Session:
+    """Create a session, with room for `pool_size` kept-alive connections."""
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
     session = requests.session()
-    cached_session = CacheControl(session, cache=FileCache(".web_cache"))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
-    response = cached_session.get(url)
-    response_content = response.content
 
-    hashobj = hashlib.sha256()
-    hashobj.update(response_content)
-    assert hashobj.hexdigest() == expected_sha256
+def download_wheel(
+    url: str, expected_sha256: str, *, session: requests.Session, store: WheelStore
+) -> Path:
+    response = session.get(url, stream=True)
+    response.raise_for_status()
+
+    # The store hashes the wheel as it arrives, and never buffers all of it.
+    with response:
+        chunks = response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)
+        return store.add(expected_sha256, chunks)
 
-    return response_content
+
+def download_wheels(
+    wheels: Iterable[Tuple[str, str]],
+    *,
+    console: Console,
+    jobs: int,
+    store: WheelStore,
+    wheel_dir: Optional[Path] = None,
+) -> Dict[str, Path]:
+    """Ensure that all of the given (url, sha256) wheels are in `store`.
+
+    Wheels which are not already stored are downloaded, `jobs` at a time. If a
+    `wheel_dir` is given, they are taken from there instead, and nothing is
+    downloaded. Returns a mapping of sha256 to the path of the stored wheel.
+    """
+    wheels = sorted(set(wheels))
+    session = create_session(pool_size=jobs)
+
+    def fetch(wheel: Tuple[str, str]) -> Path:
+        url, sha256 = wheel
+        filename = Path(urlparse(url).path).name
+        with TRACER.span("verify", wheel=filename):
+            path = store.get(sha256)
+        if path is not None:
+            return path
+        if wheel_dir is not None:
+            console.log(f"  Copying [green]{filename}[reset] from {wheel_dir}")
+            with TRACER.span("download", wheel=filename, source=wheel_dir):
+                with (wheel_dir / filename).open("rb") as f:
+                    chunks = iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b"")
+                    return store.add(sha256, chunks)
+        console.log(f"  Downloading [green]{filename}")
+        with TRACER.span("download", wheel=filename, source=url):
+            return download_wheel(url, sha256, session=session, store=store)
+
+    with session, ThreadPoolExecutor(max_workers=jobs) as executor:
+        paths = executor.map(fetch, wheels)
+        return {sha256: path for (_, sha256), path in zip(wheels, paths)}
 
 
 def populated_script_constraints(original_constraints):
@@ -210,40 +950,276 @@ def populated_script_constraints(original_constraints):
         yield variant, mapping
 
 
-def repack_wheel(data: bytes):
-    """Remove the .dist-info, so that this is no longer a valid wheel."""
+def copy_zip_member(source: Buffer, zipinfo: ZipInfo, dest: ZipFile) -> None:
+    """Copy a member of the zip file in `source` into `dest`, as-is.
+
+    The member's compressed bytes, CRC and sizes are carried over without being
+    decompressed and compressed again. Everything else matches what
+    `dest.writestr(zipinfo, ...)` would have written.
+    """
+    offset = zipinfo.header_offset
+    assert source[offset : offset + 4] == b"PK\x03\x04", zipinfo.filename
+    assert not zipinfo.flag_bits & 0x01, f"{zipinfo.filename} is encrypted"
+
+    # The local header is followed by a filename and extra field, of lengths that
+    # can differ from the ones in the central directory.
+    name_length, extra_length = LOCAL_HEADER_LENGTHS.unpack_from(source, offset + 26)
+    start = offset + 30 + name_length + extra_length
+    compressed = memoryview(source)[start : start + zipinfo.compress_size]
+
+    # Sizes and the CRC are written up front, so no data descriptor is needed.
+    zipinfo.flag_bits = 0x02 if zipinfo.compress_type == ZIP_LZMA else 0x00
+    if not zipinfo.external_attr:
+        zipinfo.external_attr = 0o600 << 16
+    zip64 = zipinfo.file_size * 1.05 > ZIP64_LIMIT
+
+    zipinfo.header_offset = dest.fp.tell()
+    dest.fp.write(zipinfo.FileHeader(zip64))
+    dest.fp.write(compressed)
+    dest.start_dir = dest.fp.tell()
+    dest.filelist.append(zipinfo)
+    dest.NameToInfo[zipinfo.filename] = zipinfo
+
+
+class BufferReader(io.RawIOBase):
+    """A seekable, read-only file over a buffer, which does not copy it."""
+
+    def __init__(self, data: Buffer) -> None:
+        self._view = memoryview(data)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {
+            io.SEEK_SET: 0,
+            io.SEEK_CUR: self._position,
+            io.SEEK_END: len(self._view),
+        }
+        self._position = base[whence] + offset
+        return self._position
+
+    def readinto(self, buffer: Any) -> int:
+        chunk = self._view[self._position : self._position + len(buffer)]
+        buffer[: len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+
+def open_zip(data: Buffer) -> ZipFile:
+    """Open the zip file in `data`, without making a copy of it."""
+    return ZipFile(BufferReader(data))
+
+
+def repack_wheel(data: Buffer, *, hide_metadata: bool = False):
+    """Remove the .dist-info, so that this is no longer a valid wheel.
+
+    Otherwise, pip would find itself installed wherever it is imported from. With
+    `hide_metadata`, the .dist-info is moved under METADATA_PREFIX instead, from
+    where templates/default.py can put the original wheel back together.
+    """
     new_data = BytesIO()
-    with ZipFile(BytesIO(data)) as existing_zip:
+    with open_zip(data) as existing_zip:
         with ZipFile(new_data, mode="w") as new_zip:
             for zipinfo in existing_zip.infolist():
                 if re.search(r"pip-.+\.dist-info/", zipinfo.filename):
+                    if not hide_metadata:
+                        continue
+                    zipinfo.filename = METADATA_PREFIX + zipinfo.filename
+                copy_zip_member(data, zipinfo, new_zip)
+
+    return new_data.getvalue()
+
+
+def wheel_filename(data: Buffer) -> str:
+    """Work out the filename of a wheel, from the metadata in it."""
+    with open_zip(data) as wheel:
+        for name in wheel.namelist():
+            match = re.fullmatch(r"(pip-[^/-]+)\.dist-info/WHEEL", name)
+            if match:
+                break
+        else:
+            raise ValueError("The wheel has no .dist-info/WHEEL file")
+        metadata = wheel.read(name).decode("utf-8")
+
+    # Tags are compressed into one, e.g. py2-none-any and py3-none-any become
+    # py2.py3-none-any.
+    tags = [
+        line.split(":", 1)[1].strip().split("-")
+        for line in metadata.splitlines()
+        if line.startswith("Tag:")
+    ]
+    parts = (".".join(dict.fromkeys(tag[i] for tag in tags)) for i in range(3))
+    return f"{match.group(1)}-{'-'.join(parts)}.whl"
+
+
+def solid_archive(data: Buffer) -> bytes:
+    """Turn a zip file into a tarball with the same files, compressed with xz.
+
+    The tarball is reproducible: its members are in the same order as in the
+    zip file, and have the same timestamps, with no owners.
+    """
+    new_data = BytesIO()
+    with open_zip(data) as existing_zip:
+        with tarfile.open(fileobj=new_data, mode="w:xz", preset=XZ_PRESET) as tar:
+            for zipinfo in existing_zip.infolist():
+                if zipinfo.is_dir():
                     continue
-                new_zip.writestr(zipinfo, existing_zip.read(zipinfo))
+                tarinfo = tarfile.TarInfo(zipinfo.filename)
+                tarinfo.size = zipinfo.file_size
+                tarinfo.mtime = calendar.timegm(zipinfo.date_time + (0, 0, 0))
+                tarinfo.mode = (zipinfo.external_attr >> 16) & 0o777 or 0o644
+                with existing_zip.open(zipinfo) as member:
+                    tar.addfile(tarinfo, member)
+
+    return new_data.getvalue()
+
+
+def bundle_wheels(data: bytes, wheels: Iterable[Tuple[str, Buffer]]) -> bytes:
+    """Add the given (filename, data) wheels to a zip file, under WHEELHOUSE_PREFIX.
+
+    The wheels are stored as they are, since they are compressed already.
+    """
+    new_data = BytesIO(data)
+    with ZipFile(new_data, mode="a") as new_zip:
+        for filename, wheel in wheels:
+            zipinfo = ZipInfo(WHEELHOUSE_PREFIX + filename)
+            zipinfo.external_attr = 0o644 << 16
+            new_zip.writestr(zipinfo, bytes(wheel), compress_type=ZIP_STORED)
 
     return new_data.getvalue()
 
 
-def encode_wheel_contents(data: bytes) -> str:
-    zipdata = b85encode(data).decode("utf8")
+def _b85encode_numpy(data: bytes) -> bytes:
+    """Base85-encode `data` and wrap it into lines, with vectorized operations."""
+    padding = -len(data) % 4
+    words = numpy.frombuffer(data + b"\0" * padding, dtype=">u4").astype("u4")
+
+    # Peel off the base85 digits of every word at once, least significant first.
+    digits = numpy.empty((len(words), 5), dtype="u1")
+    for i in reversed(range(5)):
+        words, digits[:, i] = numpy.divmod(words, 85)
+    encoded = numpy.frombuffer(B85_ALPHABET, dtype="u1")[digits].ravel()
+    encoded = encoded[: len(encoded) - padding]
+
+    # Lay the full lines out as rows, and give each row a trailing newline.
+    full = len(encoded) - len(encoded) % PAYLOAD_LINE_LENGTH
+    lines = encoded[:full].reshape(-1, PAYLOAD_LINE_LENGTH)
+    newlines = numpy.full((len(lines), 1), ord("\n"), dtype="u1")
+    wrapped = numpy.hstack((lines, newlines)).tobytes() + encoded[full:].tobytes()
+    return wrapped.rstrip(b"\n")
+
+
+def _b85encode_python(data: bytes) -> bytes:
+    """Base85-encode `data` and wrap it into lines, in pure Python.
+
+    This matches `base64.b85encode()`, with less work done per 4-byte word.
+    """
+    padding = -len(data) % 4
+    data += b"\0" * padding
+    words = struct.unpack(f">{len(data) // 4}I", data)
+
+    chars, chars2 = B85_CHARS, B85_CHARS2
+    encoded = b"".join(
+        [chars2[w // 614125] + chars2[w // 85 % 7225] + chars[w % 85] for w in words]
+    )
+    encoded = encoded[: len(encoded) - padding]
+
+    return b"\n".join(
+        encoded[i : i + PAYLOAD_LINE_LENGTH]
+        for i in range(0, len(encoded), PAYLOAD_LINE_LENGTH)
+    )
+
+
+def _base64encode(data: bytes) -> bytes:
+    """Base64-encode `data`, wrapped into lines of 76 characters."""
+    return base64.encodebytes(data).rstrip(b"\n")
+
 
-    chunked = []
-    for i in range(0, len(zipdata), 79):
-        chunked.append(zipdata[i : i + 79])
+def iter_encoded_blocks(data: bytes, codec: str = "base85") -> Iterator[bytes]:
+    """Yield the encoding of `data`, as blocks of newline-separated lines.
 
-    return "\n".join(chunked)
+    Joining the blocks with newlines gives the complete encoding. NumPy is used
+    to speed up base85, when it is available.
+    """
+    if codec == "base64":
+        encode = _base64encode
+    elif numpy is not None:
+        encode = _b85encode_numpy
+    else:
+        encode = _b85encode_python
+    block_size = ENCODE_BLOCK_SIZES[codec]
+    view = memoryview(data)
+    for start in range(0, len(data), block_size):
+        with TRACER.span("encode", codec=codec, offset=start):
+            block = encode(view[start : start + block_size].tobytes())
+        yield block
+
+
+def encode_wheel_contents(data: bytes, codec: str = "base85") -> str:
+    return b"\n".join(iter_encoded_blocks(data, codec)).decode("ascii")
+
+
+class WheelArtifacts:
+    """The products of a single pip wheel, each computed at most once per run.
+
+    Several scripts and zipapps can be built from the same wheel, so these are
+    shared between all of them, keyed by the wheel's sha256. The encoded payload
+    is not kept, as it is streamed into each script with `iter_encoded_blocks()`.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Only the path is sent to other processes, which map the wheel themselves.
+        return {"path": self.path}
+
+    @cached_property
+    def data(self) -> mmap.mmap:
+        with self.path.open("rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @cached_property
+    def repacked(self) -> bytes:
+        with TRACER.span("repack", wheel=self.path.name):
+            return repack_wheel(self.data)
+
+    @cached_property
+    def installable(self) -> bytes:
+        with TRACER.span("repack", wheel=self.path.name, hide_metadata=True):
+            return repack_wheel(self.data, hide_metadata=True)
+
+    @cached_property
+    def solid(self) -> bytes:
+        with TRACER.span("compress", wheel=self.path.name):
+            return solid_archive(self.installable)
+
+    @cached_property
+    def filename(self) -> str:
+        return wheel_filename(self.data)
+
+    def payload(self, payload_format: str) -> bytes:
+        """The payload for templates/default.py, which can rebuild the wheel."""
+        return self.solid if payload_format == "tar.xz" else self.installable
 
 
 def determine_destination(base: str, variant: str) -> Path:
     public = Path(base)
-    if not public.exists():
-        public.mkdir()
+    public.mkdir(exist_ok=True)
 
     if variant == "default":
         return public / "get-pip.py"
 
     retval = public / variant / "get-pip.py"
-    if not retval.parent.exists():
-        retval.parent.mkdir()
+    retval.parent.mkdir(exist_ok=True)
 
     return retval
 
@@ -257,34 +1233,116 @@ def detect_newline(f: TextIO) -> str:
     return "\n"  # Template has mixed newlines, default to LF.
 
 
-def generate_one(variant, mapping, *, console, pip_versions):
-    # Determing the correct wheel to download
-    pip_version = determine_latest(pip_versions.keys(), constraint=mapping["pip"])
-    wheel_url, wheel_hash = pip_versions[pip_version]
+@contextlib.contextmanager
+def atomic_open(destination: Path, mode: str, **kwargs: Any) -> Iterator[IO[Any]]:
+    """Open a temporary file, which replaces `destination` once it is written.
 
-    console.log(f"  Downloading [green]{Path(wheel_url).name}")
-    original_wheel = download_wheel(wheel_url, wheel_hash)
-    repacked_wheel = repack_wheel(original_wheel)
-    encoded_wheel = encode_wheel_contents(repacked_wheel)
+    This ensures that a partially written file is never seen at `destination`,
+    even when several processes write to the same directory.
+    """
+    temporary = destination.with_name(f".{destination.name}.{os.getpid()}.tmp")
+    try:
+        with open(temporary, mode, **kwargs) as f:
+            yield f
+        os.replace(temporary, destination)
+    finally:
+        if temporary.exists():
+            temporary.unlink()
+
+
+def render_payload_template(
+    template: Path,
+    destination: Path,
+    *,
+    payload: Iterable[bytes],
+    **context: Any,
+) -> None:
+    """Render `template` into `destination`, streaming the payload into it.
 
-    # Generate the script, by rendering the template
-    template = determine_template(pip_version)
-    console.log(f"  Rendering [yellow]{template}")
+    The template is split around its `{zipfile}` placeholder, and the encoded
+    payload blocks are written out between the two halves as they are produced,
+    so that the rendered script is never held in memory as a whole.
+    """
     with template.open() as f:
         newline = detect_newline(f)
-        rendered_template = f.read().format(
-            zipfile=encoded_wheel,
-            installed_version=pip_version,
-            pip_version=mapping["pip"],
-            setuptools_version=mapping["setuptools"],
-            wheel_version=mapping["wheel"],
-            minimum_supported_version=mapping["minimum_supported_version"],
+        head, placeholder, tail = f.read().partition("{zipfile}")
+    assert placeholder, f"{template} has no {{zipfile}} placeholder"
+
+    with TRACER.span("render", destination=destination):
+        with atomic_open(destination, "w", newline=newline) as f:
+            f.write(head.format(**context))
+            for i, block in enumerate(payload):
+                if i:
+                    f.write("\n")
+                f.write(block.decode("ascii"))
+            f.write(tail.format(**context))
+
+
+def determine_full_destination(base: str, variant: str) -> Path:
+    """Where the "full" script of a variant goes, next to its get-pip.py."""
+    return determine_destination(base, variant).with_name("get-pip-full.py")
+
+
+def generate_one(
+    variant,
+    mapping,
+    *,
+    console,
+    pip_version,
+    wheel,
+    payload_format="zip",
+    bundled=(),
+):
+    """Generate the get-pip.py of a variant, or with `bundled` wheels, its full script.
+
+    `bundled` are the (filename, WheelArtifacts) of the wheels to install along with
+    pip: setuptools, wheel, and everything they require.
+    """
+    console.log(f"  Using [green]pip {pip_version}")
+
+    # Generate the script, by rendering the template into the correct location
+    template = determine_template(pip_version)
+    if bundled:
+        destination = determine_full_destination("public", variant)
+    else:
+        destination = determine_destination("public", variant)
+    codec = determine_payload_codec(template)
+    assert (
+        payload_format == "zip" or template.name == "default.py"
+    ), f"{template} can only unpack a zip file, not a {payload_format}"
+    assert (
+        not bundled or template.name == "default.py"
+    ), f"{template} cannot install bundled wheels"
+    if bundled:
+        payload = bundle_wheels(
+            wheel.installable,
+            ((filename, artifacts.data) for filename, artifacts in bundled),
         )
-    # Write the script to the correct location
-    destination = determine_destination("public", variant)
-    console.log(f"  Writing [blue]{destination}")
-    with destination.open("w", newline=newline) as f:
-        f.write(rendered_template)
+        if payload_format == "tar.xz":
+            with TRACER.span("compress", wheel=wheel.path.name, bundled=True):
+                payload = solid_archive(payload)
+    elif template.name == "default.py":
+        payload = wheel.payload(payload_format)
+    else:
+        payload = wheel.repacked
+    console.log(f"  Rendering [yellow]{template}[reset] to [blue]{destination}")
+    render_payload_template(
+        template,
+        destination,
+        payload=iter_encoded_blocks(payload, codec),
+        payload_codec=codec,
+        payload_format=payload_format,
+        payload_sha256=hashlib.sha256(payload).hexdigest(),
+        metadata_prefix=METADATA_PREFIX,
+        wheel_filename=wheel.filename,
+        wheelhouse_prefix=WHEELHOUSE_PREFIX,
+        bundled_projects=json.dumps(BUNDLED_PROJECTS if bundled else []),
+        installed_version=pip_version,
+        pip_version=mapping["pip"],
+        setuptools_version=mapping["setuptools"],
+        wheel_version=mapping["wheel"],
+        minimum_supported_version=mapping["minimum_supported_version"],
+    )
 
 
 def generate_moved(destination: str, *, location: str, console: Console):
@@ -296,14 +1354,14 @@ def generate_moved(destination: str, *, location: str, console: Console):
         rendered_template = f.read().format(location=location)
     console.log(f"  Writing [blue]{destination}[reset]")
     console.log(f"    Points users to [cyan]{location}[reset]")
-    with open(destination, "w", newline=newline) as f:
+    with atomic_open(Path(destination), "w", newline=newline) as f:
         f.write(rendered_template)
 
 
 def zipapp_location(pip_version: Version) -> Path:
     zipapp_dir = Path("public/zipapp")
     # Ensure that the zipapp directory is present
-    zipapp_dir.mkdir(exist_ok=True)
+    zipapp_dir.mkdir(parents=True, exist_ok=True)
     return zipapp_dir / f"pip-{pip_version}.pyz"
 
 
@@ -311,15 +1369,13 @@ def generate_zipapp(
     pip_version: Version,
     *,
     console: Console,
-    pip_versions: Dict[Version, Tuple[str, str]],
+    wheel: WheelArtifacts,
 ) -> None:
-    wheel_url, wheel_hash = pip_versions[pip_version]
-    console.log(f"  Downloading [green]{Path(wheel_url).name}")
-    original_wheel = download_wheel(wheel_url, wheel_hash)
+    original_wheel = wheel.data
     zipapp_name = zipapp_location(pip_version)
 
     console.log(f"  Creating [green]{zipapp_name}")
-    with open(zipapp_name, "wb") as f:
+    with atomic_open(zipapp_name, "wb") as f:
         # Write shebang at the start of the file
         f.write(b"#!/usr/bin/env python\n")
 
@@ -330,12 +1386,11 @@ def generate_zipapp(
             # Version check - 0 means "don't check"
             major = 0
             minor = 0
-            with ZipFile(io.BytesIO(original_wheel)) as src:
+            with open_zip(original_wheel) as src:
                 for info in src.infolist():
                     # Ignore all content apart from the "pip" subdirectory
                     if info.filename.startswith("pip/"):
-                        data = src.read(info)
-                        dest.writestr(info, data)
+                        copy_zip_member(original_wheel, info, dest)
                     elif info.filename.endswith(".dist-info/METADATA"):
                         data = bytes_to_json(src.read(info))
                         if "requires_python" in data:
@@ -371,23 +1426,505 @@ def generate_zipapp(
 
 def generate_zipapp_for_current(pip_version: Version) -> None:
     zipapp_name = zipapp_location(pip_version)
-    unversioned_name = "public/pip.pyz"
-    shutil.copy(zipapp_name, unversioned_name)
+    unversioned_name = Path("public/pip.pyz")
+    with zipapp_name.open("rb") as src, atomic_open(unversioned_name, "wb") as dest:
+        shutil.copyfileobj(src, dest)
+
+
+def file_sha256(path: Path) -> str:
+    hashobj = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            hashobj.update(chunk)
+    return hashobj.hexdigest()
+
+
+def load_manifest(path: Path) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Load what every output was last generated from, keyed by output path.
+
+    Returns None if there is no usable manifest: if it is missing or cannot be
+    read, or if it was written by a different generator, as that could have
+    generated different outputs from the same inputs. Nothing is known about
+    what is in public/ then, so it has to be regenerated from scratch.
+    """
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        if manifest["generator_sha256"] != file_sha256(Path(__file__)):
+            return None
+        return manifest["outputs"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def is_up_to_date(
+    destination: Path, inputs: Dict[str, Any], manifest: Dict[str, Dict[str, Any]]
+) -> bool:
+    """Whether `destination` was generated from `inputs`, and not changed since."""
+    recorded = dict(manifest.get(destination.as_posix(), {}))
+    output_sha256 = recorded.pop("output_sha256", None)
+    if recorded != inputs or not destination.exists():
+        return False
+    return file_sha256(destination) == output_sha256
+
+
+def write_manifest(
+    path: Path,
+    outputs: List[Tuple[Path, Dict[str, Any]]],
+    *,
+    previous: Dict[str, Dict[str, Any]],
+    stale: Set[Path],
+) -> None:
+    entries = {}
+    for destination, inputs in outputs:
+        name = destination.as_posix()
+        if destination in stale:
+            output_sha256 = file_sha256(destination)
+        else:
+            output_sha256 = previous[name]["output_sha256"]
+        entries[name] = {**inputs, "output_sha256": output_sha256}
+
+    manifest = {
+        "generator_sha256": file_sha256(Path(__file__)),
+        "outputs": dict(sorted(entries.items())),
+    }
+    with atomic_open(path, "w", encoding="utf-8", newline="\n") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+
+
+# A unit of work for `run_jobs()`: a message to log, a function, and the keyword
+# arguments (apart from `console`) to call it with.
+Job = Tuple[str, Callable[..., None], Dict[str, Any]]
+
+
+def _call_job(function: Callable[..., None], kwargs: Dict[str, Any], console):
+    # Label the job's span with what it generates.
+    labels = {key: kwargs[key] for key in ("variant", "pip_version") if key in kwargs}
+    with TRACER.span(function.__name__, **labels):
+        function(console=console, **kwargs)
+
+
+def _start_worker(track_memory: bool) -> None:
+    """Trace a worker process in the same way as its parent."""
+    TRACER.memory = None
+    if track_memory:
+        TRACER.track_memory()
+
+
+def _run_job(
+    function: Callable[..., None], kwargs: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """Run a job in a worker process, returning the spans it recorded."""
+    TRACER.events = []
+    if TRACER.memory:
+        # Only the samples that are taken during the job are returned.
+        TRACER.memory.counter_events()
+    _call_job(function, kwargs, Console())
+    if TRACER.memory:
+        TRACER.events.extend(TRACER.memory.counter_events())
+    return TRACER.events
+
+
+def run_jobs(jobs: List[Job], *, console: Console, processes: int) -> None:
+    """Run independent jobs, either in this process or in a pool of processes."""
+    if processes == 1:
+        for message, function, kwargs in jobs:
+            console.log(message)
+            _call_job(function, kwargs, console)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_start_worker,
+        initargs=(TRACER.memory is not None,),
+    ) as executor:
+        futures = {}
+        for message, function, kwargs in jobs:
+            futures[executor.submit(_run_job, function, kwargs)] = message
+        for future in as_completed(futures):
+            TRACER.events.extend(future.result())
+            console.log(f"{futures[future]} [green]done")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--download-jobs",
+        type=int,
+        default=8,
+        metavar="N",
+        help="number of wheels to download concurrently (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="number of processes to generate scripts and zipapps with "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=Path(".generate_cache"),
+        metavar="DIR",
+        help="directory to keep downloaded wheels in (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-cache-size",
+        type=int,
+        default=1024,
+        metavar="MiB",
+        help="size above which the least recently used wheels are evicted "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--index-url",
+        default=DEFAULT_INDEX_URL,
+        metavar="URL",
+        help="simple API to discover pip's releases from, such as one served "
+        "by scripts/index_server.py (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--lockfile",
+        type=Path,
+        metavar="PATH",
+        help="take pip's releases from this lockfile, rather than from PyPI",
+    )
+    parser.add_argument(
+        "--update-lockfile",
+        action="store_true",
+        help="write pip's releases on PyPI to --lockfile and exit, saving the "
+        "wheels that are needed into --wheel-dir if it is given",
+    )
+    parser.add_argument(
+        "--wheel-dir",
+        type=Path,
+        metavar="DIR",
+        help="take wheels from this directory, rather than downloading them",
+    )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        metavar="PATH",
+        help="write the time spent in each stage as a Chrome trace to PATH",
+    )
+    parser.add_argument(
+        "--timings",
+        type=Path,
+        metavar="PATH",
+        help="write a JSON summary of the time spent in each stage to PATH",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help=(
+            "also record the peak memory use, and the largest allocation sites, "
+            "of each stage (slow)"
+        ),
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        metavar="MiB",
+        help="fail if the peak RSS of any one process exceeds this",
+    )
+    parser.add_argument(
+        "--payload-format",
+        choices=PAYLOAD_FORMATS,
+        default="zip",
+        help="the format of the copy of pip in the scripts for Python 3.6+, "
+        "i.e. those rendered from templates/default.py (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--full-scripts",
+        action="store_true",
+        help="also generate get-pip-full.py next to the scripts for Python 3.6+, "
+        "which bundle setuptools and wheel, so that they need no index",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help=f"regenerate everything, rather than only what is out of date "
+        f"according to {MANIFEST_PATH}",
+    )
+    args = parser.parse_args()
+    if args.download_jobs < 1:
+        parser.error("--download-jobs must be at least 1")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.update_lockfile and not args.lockfile:
+        parser.error("--update-lockfile requires --lockfile")
+    if args.full_scripts and args.lockfile:
+        parser.error("--full-scripts needs the index, so it cannot use --lockfile")
+    if args.trace_memory and not hasattr(tracemalloc, "reset_peak"):
+        parser.error("--trace-memory requires Python 3.9 or newer")
+    if args.memory_budget is not None and resource is None:
+        parser.error("--memory-budget is not supported on this platform")
+    return args
+
+
+def report_timings(
+    tracer: Tracer,
+    *,
+    console: Console,
+    trace: Optional[Path],
+    timings: Optional[Path],
+) -> None:
+    summary = tracer.summary()
+    memory = tracer.memory is not None
+
+    def mib(size: Optional[int]) -> str:
+        return "-" if size is None else f"{size / 1024 / 1024:.1f} MiB"
+
+    table = Table(title="Time spent per stage")
+    table.add_column("Stage")
+    table.add_column("Count", justify="right")
+    table.add_column("Total", justify="right")
+    table.add_column("Longest", justify="right")
+    if memory:
+        table.add_column("Peak traced", justify="right")
+        table.add_column("Peak RSS", justify="right")
+    for name, stage in summary["stages"].items():
+        cells = [
+            name,
+            str(stage["count"]),
+            f"{stage['total_seconds']:.3f} s",
+            f"{stage['max_seconds']:.3f} s",
+        ]
+        if memory:
+            cells.append(mib(stage.get("peak_traced_bytes")))
+            cells.append(mib(stage.get("peak_rss_bytes")))
+        table.add_row(*cells)
+    console.print(table)
+
+    if memory:
+        table = Table(title="Largest allocation sites, per stage")
+        table.add_column("Stage")
+        table.add_column("Site")
+        table.add_column("Size", justify="right")
+        table.add_column("Blocks", justify="right")
+        for name, stage in summary["stages"].items():
+            for site in stage.get("top_allocations", [])[:3]:
+                table.add_row(
+                    name, site["site"], mib(site["size_bytes"]), str(site["count"])
+                )
+        console.print(table)
+
+    if trace:
+        tracer.write_trace(trace)
+        console.log(f"Wrote a Chrome trace to [blue]{trace}")
+    if timings:
+        timings.write_text(json.dumps(summary, indent=2) + "\n", encoding="utf-8")
+        console.log(f"Wrote a summary of the timings to [blue]{timings}")
+
+
+def update_lockfile(
+    pip_versions: Dict[Version, Tuple[str, str]],
+    *,
+    args: argparse.Namespace,
+    console: Console,
+    store: WheelStore,
+) -> None:
+    """Lock pip's releases, and export the wheels needed for an offline build."""
+    write_lockfile(args.lockfile, pip_versions)
+    console.log(f"Wrote [blue]{args.lockfile}")
+    if args.wheel_dir is None:
+        return
+
+    required = [pip_versions[v] for v in required_pip_versions(pip_versions)]
+    with console.status("Downloading wheels..."):
+        wheels = download_wheels(
+            required, console=console, jobs=args.download_jobs, store=store
+        )
+    args.wheel_dir.mkdir(parents=True, exist_ok=True)
+    for url, sha256 in required:
+        destination = args.wheel_dir / Path(urlparse(url).path).name
+        if not destination.exists():
+            shutil.copyfile(wheels[sha256], destination)
+    console.log(f"Saved {len(required)} wheels to [blue]{args.wheel_dir}")
 
 
 def main() -> None:
+    args = parse_args()
     console = Console()
+    if args.trace_memory:
+        TRACER.track_memory()
     with console.status("Fetching pip versions..."):
-        pip_versions = get_all_pip_versions()
+        if args.lockfile and not args.update_lockfile:
+            with TRACER.span("discover", source=args.lockfile):
+                pip_versions = read_lockfile(args.lockfile)
+        else:
+            with TRACER.span("discover", source=args.index_url):
+                pip_versions = get_all_pip_versions(
+                    cache_dir=args.cache_dir, index_url=args.index_url
+                )
         console.log(f"Found {len(pip_versions)} available pip versions.")
         console.log(f"Latest version: {max(pip_versions)}")
 
-    with console.status("Generating scripts...") as status:
-        for variant, mapping in populated_script_constraints(SCRIPT_CONSTRAINTS):
-            status.update(f"Working on [magenta]{variant}")
-            console.log(f"[magenta]{variant}")
+    store = WheelStore(
+        args.cache_dir / "wheels", max_size=args.max_cache_size * 1024 * 1024
+    )
+    if args.update_lockfile:
+        update_lockfile(pip_versions, args=args, console=console, store=store)
+        return
+
+    manifest = None if args.full else load_manifest(MANIFEST_PATH)
+    if manifest is None:
+        # Without a manifest, outputs that are no longer generated cannot be
+        # told apart from the others, so start from an empty public/.
+        if not args.full:
+            console.log(f"No usable {MANIFEST_PATH}, regenerating everything")
+        shutil.rmtree("public", ignore_errors=True)
+        manifest = {}
+
+    # Work out what every output should be generated from.
+    scripts = {}
+    for variant, mapping in populated_script_constraints(SCRIPT_CONSTRAINTS):
+        pip_version = determine_latest(pip_versions.keys(), constraint=mapping["pip"])
+        template = determine_template(pip_version)
+        inputs = {
+            "pip_version": str(pip_version),
+            "wheel_sha256": pip_versions[pip_version][1],
+            "template_sha256": file_sha256(template),
+            "codec": determine_payload_codec(template),
+            "format": args.payload_format if template.name == "default.py" else "zip",
+            "constraints": mapping,
+        }
+        scripts[variant] = (determine_destination("public", variant), inputs)
+
+    # The full scripts bundle the newest setuptools and wheel that the oldest
+    # Python they are for can use, and everything that those require. Their
+    # wheels are downloaded here already, to read their requirements.
+    full_scripts = {}
+    bundled_urls = {}
+    if args.full_scripts:
+        available = {}
+        requirements = {}
+
+        def get_wheels(project: str) -> Dict[str, Dict[str, Any]]:
+            if project not in available:
+                available[project] = get_all_wheels(
+                    project, cache_dir=args.cache_dir, index_url=args.index_url
+                )
+            return available[project]
+
+        def get_requirements(url: str, sha256: str) -> List[Requirement]:
+            if sha256 not in requirements:
+                paths = download_wheels(
+                    [(url, sha256)], console=console, jobs=1, store=store
+                )
+                requirements[sha256] = read_requirements(paths[sha256])
+            return requirements[sha256]
+
+        with console.status("Picking the wheels to bundle..."):
+            for variant, mapping in populated_script_constraints(SCRIPT_CONSTRAINTS):
+                inputs = scripts[variant][1]
+                template = determine_template(Version(inputs["pip_version"]))
+                if template.name != "default.py":
+                    continue
+                major, minor = map(
+                    int, re.findall(r"\d+", mapping["minimum_supported_version"])
+                )
+                newest = NEWEST_PYTHON[1] if variant == "default" else minor
+                pythons = [f"{major}.{m}" for m in range(minor, max(minor, newest) + 1)]
+                picked = determine_bundled_wheels(
+                    mapping,
+                    pip_version=Version(inputs["pip_version"]),
+                    pythons=pythons,
+                    get_wheels=get_wheels,
+                    get_requirements=get_requirements,
+                )
+                bundled = {}
+                for filename, url, sha256 in picked.values():
+                    bundled[filename] = sha256
+                    bundled_urls[sha256] = url
+                full_scripts[variant] = (
+                    determine_full_destination("public", variant),
+                    dict(inputs, bundled=bundled),
+                )
+
+    zipapps = {}
+    for version in pip_versions:
+        if version < OLDEST_ZIPAPP:
+            continue
+        inputs = {
+            "pip_version": str(version),
+            "wheel_sha256": pip_versions[version][1],
+            "template_sha256": file_sha256(Path("templates") / "zipapp_main.py"),
+        }
+        zipapps[version] = (zipapp_location(version), inputs)
+    current_zipapp = (Path("public/pip.pyz"), zipapps[max(pip_versions)][1])
+
+    outputs = [
+        *scripts.values(),
+        *full_scripts.values(),
+        *zipapps.values(),
+        current_zipapp,
+    ]
+    stale = {
+        destination
+        for destination, inputs in outputs
+        if not is_up_to_date(destination, inputs, manifest)
+    }
+    console.log(f"{len(stale)} of {len(outputs)} outputs need to be generated.")
+
+    with console.status("Downloading wheels..."):
+        wheels = download_wheels(
+            itertools.chain(
+                (
+                    pip_versions[Version(inputs["pip_version"])]
+                    for destination, inputs in outputs
+                    if destination in stale
+                ),
+                (
+                    (bundled_urls[sha256], sha256)
+                    for destination, inputs in full_scripts.values()
+                    if destination in stale
+                    for sha256 in inputs["bundled"].values()
+                ),
+            ),
+            console=console,
+            jobs=args.download_jobs,
+            store=store,
+            wheel_dir=args.wheel_dir,
+        )
+    artifacts = {sha256: WheelArtifacts(path) for sha256, path in wheels.items()}
 
-            generate_one(variant, mapping, console=console, pip_versions=pip_versions)
+    with console.status("Generating scripts..."):
+        jobs: List[Job] = []
+        for variant, mapping in populated_script_constraints(SCRIPT_CONSTRAINTS):
+            destination, inputs = scripts[variant]
+            if destination not in stale:
+                continue
+            kwargs = dict(
+                variant=variant,
+                mapping=mapping,
+                pip_version=Version(inputs["pip_version"]),
+                wheel=artifacts[inputs["wheel_sha256"]],
+                payload_format=inputs["format"],
+            )
+            jobs.append((f"[magenta]{variant}", generate_one, kwargs))
+        for variant, mapping in populated_script_constraints(SCRIPT_CONSTRAINTS):
+            if variant not in full_scripts:
+                continue
+            destination, inputs = full_scripts[variant]
+            if destination not in stale:
+                continue
+            kwargs = dict(
+                variant=variant,
+                mapping=mapping,
+                pip_version=Version(inputs["pip_version"]),
+                wheel=artifacts[inputs["wheel_sha256"]],
+                payload_format=inputs["format"],
+                bundled=[
+                    (filename, artifacts[sha256])
+                    for filename, sha256 in inputs["bundled"].items()
+                ],
+            )
+            jobs.append((f"[magenta]{variant} (full)", generate_one, kwargs))
+        run_jobs(jobs, console=console, processes=args.jobs)
 
     if MOVED_SCRIPTS:
         console.log("[magenta]Generating 'moved' scripts...")
@@ -396,12 +1933,42 @@ def main() -> None:
                 status.update(f"Working on [magenta]{legacy}")
                 generate_moved(legacy, console=console, location=current)
 
-    with console.status("Generating zipapps...") as status:
-        for version in pip_versions:
-            if version < OLDEST_ZIPAPP:
+    with console.status("Generating zipapps..."):
+        jobs = []
+        for version, (destination, inputs) in zipapps.items():
+            if destination not in stale:
                 continue
-            generate_zipapp(version, console=console, pip_versions=pip_versions)
-        generate_zipapp_for_current(max(pip_versions))
+            kwargs = dict(pip_version=version, wheel=artifacts[inputs["wheel_sha256"]])
+            jobs.append((f"[magenta]zipapp {version}", generate_zipapp, kwargs))
+        run_jobs(jobs, console=console, processes=args.jobs)
+        if current_zipapp[0] in stale:
+            generate_zipapp_for_current(max(pip_versions))
+
+    # Remove anything that was generated before, but is no longer wanted.
+    destinations = {destination.as_posix() for destination, _ in outputs}
+    for name in sorted(set(manifest) - destinations):
+        console.log(f"Removing [blue]{name}[reset], which is no longer generated")
+        Path(name).unlink(missing_ok=True)
+
+    write_manifest(MANIFEST_PATH, outputs, previous=manifest, stale=stale)
+
+    for path in store.evict():
+        console.log(f"Evicted [green]{path.name}[reset] from the wheel store")
+
+    if TRACER.memory:
+        TRACER.memory.stop()
+        TRACER.events.extend(TRACER.memory.counter_events())
+    if args.trace or args.timings or args.trace_memory:
+        report_timings(TRACER, console=console, trace=args.trace, timings=args.timings)
+
+    if args.memory_budget is not None:
+        peak = peak_rss() / 1024 / 1024
+        console.log(f"Peak RSS: {peak:.0f} MiB (budget: {args.memory_budget} MiB)")
+        if peak > args.memory_budget:
+            raise SystemExit(
+                f"Peak RSS of {peak:.0f} MiB exceeds the memory budget of "
+                f"{args.memory_budget} MiB"
+            )
 
 
 if __name__ == "__main__":
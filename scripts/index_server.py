@@ -0,0 +1,311 @@
+"""A local stand-in for PyPI, serving the files in a directory.
+
+This serves just enough of PyPI's APIs for scripts/generate.py and for
+get-pip.py (through pip) to work against it:
+
+- /simple/<project>/: the simple API, as JSON (PEP 691) or HTML (PEP 503).
+- /pypi/<project>/json: the JSON API.
+- /packages/<filename>: the files themselves.
+
+Responses can be delayed and throttled, so that the generator and get-pip.py
+can be measured under reproducible network conditions, without a network.
+
+Usage: python scripts/index_server.py DIRECTORY [--port PORT]
+"""
+import argparse
+import hashlib
+import html
+import json
+import re
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SIMPLE_JSON = "application/vnd.pypi.simple.v1+json"
+SIMPLE_HTML = "application/vnd.pypi.simple.v1+html"
+
+# Files are sent in chunks of this size, which is also the granularity of the
+# bandwidth shaping.
+CHUNK_SIZE = 16 * 1024
+
+
+def normalize(name: str) -> str:
+    """Normalize a project name, as defined by PEP 503."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def parse_filename(filename: str) -> Optional[Tuple[str, str]]:
+    """Get the (normalized project name, version) of a wheel or an sdist."""
+    if filename.endswith(".whl"):
+        name, version = filename.split("-")[:2]
+        return normalize(name), version
+    for extension in (".tar.gz", ".zip"):
+        if filename.endswith(extension):
+            name, _, version = filename[: -len(extension)].rpartition("-")
+            return normalize(name), version
+    return None
+
+
+def read_requires_python(path: Path) -> Optional[str]:
+    """Get the Requires-Python of a wheel, from its metadata (None for sdists)."""
+    if not path.name.endswith(".whl"):
+        return None
+    with zipfile.ZipFile(path) as wheel:
+        for name in wheel.namelist():
+            if re.fullmatch(r"[^/]+\.dist-info/METADATA", name):
+                metadata = wheel.read(name).decode("utf-8")
+                break
+        else:
+            return None
+    match = re.search(r"^Requires-Python: *(.+?)\s*$", metadata, re.MULTILINE)
+    return match.group(1) if match else None
+
+
+class Index:
+    """The projects, and their files, that are found in a directory."""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self._hashes: Dict[Tuple[str, int, float], str] = {}
+        self._requires_python: Dict[Tuple[str, int, float], Optional[str]] = {}
+
+    def sha256(self, path: Path) -> str:
+        stat = path.stat()
+        key = (path.name, stat.st_size, stat.st_mtime)
+        if key not in self._hashes:
+            self._hashes[key] = hashlib.sha256(path.read_bytes()).hexdigest()
+        return self._hashes[key]
+
+    def requires_python(self, path: Path) -> Optional[str]:
+        stat = path.stat()
+        key = (path.name, stat.st_size, stat.st_mtime)
+        if key not in self._requires_python:
+            self._requires_python[key] = read_requires_python(path)
+        return self._requires_python[key]
+
+    def files(self, project: str) -> List[Tuple[str, str]]:
+        """Get the (filename, version) of every file of `project`."""
+        retval = []
+        for path in sorted(self.directory.iterdir()):
+            parsed = parse_filename(path.name)
+            if parsed is not None and parsed[0] == normalize(project):
+                retval.append((path.name, parsed[1]))
+        return retval
+
+    def projects(self) -> List[str]:
+        names = (parse_filename(path.name) for path in self.directory.iterdir())
+        return sorted({name[0] for name in names if name is not None})
+
+
+class IndexHandler(BaseHTTPRequestHandler):
+    server: "IndexServer"
+
+    def do_GET(self) -> None:
+        time.sleep(self.server.latency)
+
+        path = self.path.split("?", 1)[0]
+        match = re.fullmatch(r"/simple/([^/]+)/?", path)
+        if match:
+            return self.send_simple(match.group(1))
+        if path.rstrip("/") == "/simple":
+            return self.send_simple_root()
+        match = re.fullmatch(r"/pypi/([^/]+)/json/?", path)
+        if match:
+            return self.send_json_api(match.group(1))
+        match = re.fullmatch(r"/packages/([^/]+)", path)
+        if match:
+            return self.send_package(match.group(1))
+        self.send_error(404)
+
+    def file_url(self, filename: str) -> str:
+        host = self.headers.get("Host", "%s:%d" % self.server.server_address[:2])
+        return f"http://{host}/packages/{filename}"
+
+    def send_simple_root(self) -> None:
+        links = "".join(
+            f'<a href="/simple/{name}/">{name}</a><br/>\n'
+            for name in self.server.index.projects()
+        )
+        body = f"<!DOCTYPE html>\n<html><body>\n{links}</body></html>\n"
+        self.send_body(body.encode(), "text/html")
+
+    def send_simple(self, project: str) -> None:
+        files = self.server.index.files(project)
+        if not files:
+            return self.send_error(404)
+        directory = self.server.index.directory
+        entries = [
+            (
+                filename,
+                self.server.index.sha256(directory / filename),
+                self.server.index.requires_python(directory / filename),
+            )
+            for filename, _ in files
+        ]
+
+        if SIMPLE_JSON in self.headers.get("Accept", ""):
+            page = {
+                "meta": {"api-version": "1.0"},
+                "name": normalize(project),
+                "files": [
+                    {
+                        "filename": filename,
+                        "url": self.file_url(filename),
+                        "hashes": {"sha256": sha256},
+                        "requires-python": requires_python,
+                    }
+                    for filename, sha256, requires_python in entries
+                ],
+            }
+            return self.send_body(json.dumps(page).encode(), SIMPLE_JSON)
+
+        links = "".join(
+            f'<a href="{html.escape(self.file_url(filename))}#sha256={sha256}"'
+            + (
+                f' data-requires-python="{html.escape(requires_python)}"'
+                if requires_python
+                else ""
+            )
+            + f">{html.escape(filename)}</a><br/>\n"
+            for filename, sha256, requires_python in entries
+        )
+        body = f"<!DOCTYPE html>\n<html><body>\n{links}</body></html>\n"
+        # Older versions of pip only accept text/html.
+        if SIMPLE_HTML in self.headers.get("Accept", ""):
+            self.send_body(body.encode(), SIMPLE_HTML)
+        else:
+            self.send_body(body.encode(), "text/html")
+
+    def send_json_api(self, project: str) -> None:
+        files = self.server.index.files(project)
+        if not files:
+            return self.send_error(404)
+        directory = self.server.index.directory
+
+        releases: Dict[str, List[Dict[str, object]]] = {}
+        for filename, version in files:
+            sha256 = self.server.index.sha256(directory / filename)
+            packagetype = "bdist_wheel" if filename.endswith(".whl") else "sdist"
+            releases.setdefault(version, []).append(
+                {
+                    "filename": filename,
+                    "url": self.file_url(filename),
+                    "digests": {"sha256": sha256},
+                    "packagetype": packagetype,
+                }
+            )
+        page = {"info": {"name": normalize(project)}, "releases": releases}
+        self.send_body(json.dumps(page).encode(), "application/json")
+
+    def send_package(self, filename: str) -> None:
+        path = self.server.index.directory / filename
+        if not path.is_file():
+            return self.send_error(404)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(path.stat().st_size))
+        self.end_headers()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                self.send_chunk(chunk)
+
+    def send_body(self, body: bytes, content_type: str) -> None:
+        """Send a generated page, which can be revalidated through its ETag."""
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()
+        if etag in self.headers.get("If-None-Match", ""):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        for start in range(0, len(body), CHUNK_SIZE):
+            self.send_chunk(body[start : start + CHUNK_SIZE])
+
+    def send_chunk(self, chunk: bytes) -> None:
+        self.wfile.write(chunk)
+        if self.server.bandwidth:
+            time.sleep(len(chunk) / self.server.bandwidth)
+
+    def log_message(self, format: str, *args: object) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class IndexServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        index: Index,
+        *,
+        latency: float = 0,
+        bandwidth: int = 0,
+        quiet: bool = False,
+    ) -> None:
+        super().__init__(address, IndexHandler)
+        self.index = index
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.quiet = quiet
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/simple/"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument(
+        "--port", type=int, default=0, help="port to listen on (default: any free)"
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0,
+        metavar="SECONDS",
+        help="delay before every response (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=int,
+        default=0,
+        metavar="BYTES",
+        help="bytes per second to send, per connection (default: unlimited)",
+    )
+    parser.add_argument("--quiet", action="store_true", help="do not log requests")
+    args = parser.parse_args()
+
+    if not args.directory.is_dir():
+        parser.error(f"{args.directory} is not a directory")
+
+    server = IndexServer(
+        (args.host, args.port),
+        Index(args.directory),
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        quiet=args.quiet,
+    )
+    # Printed first, and flushed, so that other processes can wait for it.
+    print(server.url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,18 +4,24 @@
 #
 # You may be wondering what this giant blob of binary data here is, you might
 # even be worried that we're up to something nefarious (good for you for being
-# paranoid!). This is a base85 encoding of a zip file, this zip file contains
-# an entire copy of pip (version {installed_version}).
+# paranoid!). This is a {payload_codec} encoding of a {payload_format} file, this
+# file contains an entire copy of pip (version {installed_version}).
 #
 # Pip is a thing that installs packages, pip itself is a package that someone
 # might want to install, especially if they're looking to run this get-pip.py
 # script. Pip has a lot of code to deal with the security of installing
 # packages, various edge cases on various platforms, and other such sort of
 # "tribal knowledge" that has been encoded in its code base. Because of this
-# we basically include an entire copy of pip inside this blob. We do this
-# because the alternatives are attempt to implement a "minipip" that probably
-# doesn't do things correctly and has weird edge cases, or compress pip itself
-# down into a single file.
+# we basically include an entire copy of pip inside this blob.
+#
+# Importing all of pip takes far longer than installing its wheel, though. So in
+# the simplest case, on POSIX platforms, this script installs pip's wheel (and
+# any wheels that are bundled with it) itself, as pip would: it unpacks them,
+# writes their console scripts and RECORDs, compiles their modules, and replaces
+# an older copy of them that pip installed in the same place. That is all it
+# does. Anything else, like other packages to install, arguments or settings
+# that it does not understand, a newer pip, or an installation that pip would
+# have to decide what to do about, is left to the copy of pip, as it always was.
 #
 # If you're wondering how this is created, it is generated using
 # `scripts/generate.py` in https://github.com/pypa/get-pip.
@@ -35,12 +41,24 @@ if this_python < min_version:
 
 
 import os.path
+import re
+import csv
+import time
 import pkgutil
 import shutil
+import hashlib
 import tempfile
 import argparse
+import binascii
+import warnings
 import importlib
-from base64 import b85decode
+import sysconfig
+import compileall
+import functools
+import contextlib
+import configparser
+import zipfile
+from base64 import b85decode, urlsafe_b64encode
 
 
 def include_setuptools(args):
@@ -65,21 +83,800 @@ def include_wheel(args):
     return cli and env and absent and python_lt_3_12
 
 
-def determine_pip_install_arguments():
+def determine_projects(pre):
+    """
+    Get the names of the projects that this script installs, pip first.
+    """
+    projects = ["pip"]
+    if include_setuptools(pre):
+        projects.append("setuptools")
+    if include_wheel(pre):
+        projects.append("wheel")
+    return projects
+
+
+def parse_get_pip_arguments():
+    """
+    Split get-pip.py's own options from those that are passed on to pip.
+    """
     pre_parser = argparse.ArgumentParser()
     pre_parser.add_argument("--no-setuptools", action="store_true")
     pre_parser.add_argument("--no-wheel", action="store_true")
-    pre, args = pre_parser.parse_known_args()
+    pre_parser.add_argument("--bootstrap-cache-dir")
+    pre_parser.add_argument("--in-memory", action="store_true")
+    pre_parser.add_argument("--skip-if-installed", action="store_true")
+    return pre_parser.parse_known_args()
+
+
+# The options of `pip install` that get-pip.py understands itself, which are
+# parsed by parse_pip_options() into the names here. Those that are named None
+# change neither what would be installed nor where, and are otherwise ignored.
+# Those in the first set take a value.
+PIP_VALUE_OPTIONS = {{
+    "-i": None,
+    "--index-url": None,
+    "--extra-index-url": None,
+    "-f": None,
+    "--find-links": None,
+    "--trusted-host": None,
+    "--proxy": None,
+    "--cert": None,
+    "--client-cert": None,
+    "--timeout": None,
+    "--retries": None,
+    "--cache-dir": None,
+    "-t": "target",
+    "--target": "target",
+    "--prefix": "prefix",
+}}
+PIP_FLAG_OPTIONS = {{
+    "--no-input": None,
+    "--no-color": None,
+    "--no-cache-dir": None,
+    "--disable-pip-version-check": None,
+    "-U": None,
+    "--upgrade": None,
+    "--force-reinstall": "force_reinstall",
+    "--user": "user",
+    "--no-compile": "no_compile",
+    "--no-warn-script-location": "no_warn_script_location",
+}}
+
+
+def parse_pip_options(args):
+    """
+    Parse the arguments that are passed on to pip, if they are all options in
+    PIP_VALUE_OPTIONS or PIP_FLAG_OPTIONS, or -q/--quiet and -v/--verbose.
+
+    Returns a dict of the options that have a name, and "quiet", the number of
+    -q options less the number of -v options, or None for any other arguments.
+    """
+    options = {{"quiet": 0}}
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        arg = {{"--quiet": "-q", "--verbose": "-v"}}.get(arg, arg)
+        option, _, value = arg.partition("=")
+        if option in PIP_VALUE_OPTIONS:
+            if option == arg:
+                if not args:
+                    return None
+                value = args.pop(0)
+            if PIP_VALUE_OPTIONS[option]:
+                options[PIP_VALUE_OPTIONS[option]] = value
+        elif arg in PIP_FLAG_OPTIONS:
+            if PIP_FLAG_OPTIONS[arg]:
+                options[PIP_FLAG_OPTIONS[arg]] = True
+        elif arg[:1] == "-" and arg[1:] and set(arg[1:]) <= set("qv"):
+            options["quiet"] += arg.count("q") - arg.count("v")
+        else:
+            return None
+    return options
+
+
+def normalize_name(name):
+    """
+    Normalize the name of a distribution, as it is in the filenames of its wheels.
+    """
+    return re.sub(r"[-_.]+", "_", name).lower()
+
+
+def find_metadata(name, directories):
+    """
+    Yield the .dist-info and .egg-info directories of the distribution `name`,
+    in `directories`, in the order that Python would find them in.
+    """
+    name = normalize_name(name)
+    for directory in directories:
+        try:
+            dirnames = sorted(os.listdir(directory or "."))
+        except OSError:
+            continue
+        for dirname in dirnames:
+            base, ext = os.path.splitext(dirname)
+            parts = base.split("-")
+            if ext in (".dist-info", ".egg-info") and len(parts) > 1:
+                if normalize_name(parts[0]) == name:
+                    yield os.path.join(directory or ".", dirname)
 
-    args.append("pip{pip_version}")
 
+def installed_version(name):
+    """
+    Get the version of the distribution `name` that is installed, or None.
+
+    Only its metadata is read: through importlib.metadata, or on Python 3.7 and
+    older, which do not have that, from the name of its .dist-info or .egg-info
+    directory, in the first entry of sys.path that has one.
+    """
+    try:
+        from importlib.metadata import PackageNotFoundError, version
+    except ImportError:
+        for path in find_metadata(name, sys.path):
+            return os.path.splitext(os.path.basename(path))[0].split("-")[1]
+        return None
+
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+def is_newer_than_this(version):
+    """
+    Whether `version` of pip is newer than the pip in this script, or may be.
+
+    This runs before pip, and the packaging library that it vendors, can be
+    imported, so only final releases (like 24.2) are compared. Any other version
+    may be newer, and is left for pip to decide about.
+    """
+    releases = []
+    for release in (version, "{installed_version}"):
+        if not re.match(r"\d+(\.\d+)*$", release):
+            return True
+        parts = [int(part) for part in release.split(".")]
+        while parts and parts[-1] == 0:
+            parts.pop()
+        releases.append(parts)
+    return releases[0] > releases[1]
+
+
+def is_installed(pre, args):
+    """
+    Whether everything that this script would install is installed already.
+
+    That is, the pip in this script (not just any pip that satisfies
+    "pip{pip_version}"), and setuptools and wheel, where they would be installed.
+    Nothing is decoded or imported to find out. Arguments to pip that change
+    what would be installed, or where, and settings that install somewhere other
+    than this environment, always need an install.
+    """
+    for name in ("PIP_TARGET", "PIP_PREFIX", "PIP_ROOT", "PIP_USER"):
+        if os.environ.get(name):
+            return False
+
+    options = parse_pip_options(args)
+    if options is None:
+        return False
+    for name in ("target", "prefix", "user", "force_reinstall"):
+        if options.get(name):
+            return False
+
+    if include_setuptools(pre) or include_wheel(pre):
+        return False
+    return installed_version("pip") == "{installed_version}"
+
+
+def determine_pip_install_arguments(pip_path=None, tmpdir=None):
+    pre, args = parse_get_pip_arguments()
+
+    requirements = ["pip{pip_version}"]
+    # Whether anything has to come from the index, even if pip does not.
+    needs_index = False
     if include_setuptools(pre):
-        args.append("setuptools{setuptools_version}")
+        requirements.append("setuptools{setuptools_version}")
+        needs_index = needs_index or "setuptools" not in BUNDLED_PROJECTS
 
     if include_wheel(pre):
-        args.append("wheel{wheel_version}")
+        requirements.append("wheel{wheel_version}")
+        needs_index = needs_index or "wheel" not in BUNDLED_PROJECTS
+
+    installed = installed_version("pip")
+    newer = installed is not None and is_newer_than_this(installed)
+    if not newer and can_install_offline(args):
+        # The pip in this script was the newest release that satisfied
+        # "pip{pip_version}" when this script was generated, so install exactly
+        # that, whether or not setuptools or wheel have to come from the index.
+        # A newer pip is left to "pip install --upgrade", which never downgrades
+        # it.
+        requirements[0] = "pip=={installed_version}"
+        # It is installed from its own wheel (and any bundled wheels), unless
+        # nothing can be written to disk (with --in-memory), when the same
+        # release comes from the index.
+        if pip_path and tmpdir:
+            wheelhouse = os.path.join(tmpdir, "wheelhouse")
+            if not os.path.isdir(wheelhouse):
+                # Unless install_without_pip() got as far as building it.
+                build_wheel(pip_path, wheelhouse)
+            args += ["--find-links", wheelhouse]
+            if not needs_index:
+                args.append("--no-index")
+
+    return ["install", "--upgrade", "--force-reinstall"] + args + requirements
 
-    return ["install", "--upgrade", "--force-reinstall"] + args
+
+def can_install_offline(args):
+    """
+    Whether the user's arguments to pip leave the version of pip up to us.
+
+    That is, they give no requirements or constraints of their own, and do not
+    rule out installing pip from a wheel.
+    """
+    from pip._internal.commands import create_command
+
+    options, requirements = create_command("install").parse_args(list(args))
+    return not (
+        requirements
+        or options.requirements
+        or options.constraints
+        or options.editables
+        or options.format_control.no_binary
+    )
+
+
+def build_wheel(pip_path, directory):
+    """Put pip's wheel back together, in a new directory at `directory`.
+
+    `pip_path` is the zip file or the directory that pip is imported from, where
+    the wheel's .dist-info is hidden under METADATA_PREFIX. Any wheels that are
+    bundled with pip, under WHEELHOUSE_PREFIX, are copied into `directory` too.
+    """
+    os.mkdir(directory)
+    with zipfile.ZipFile(os.path.join(directory, WHEEL_FILENAME), "w") as wheel:
+        if os.path.isdir(pip_path):
+            for root, dirs, files in os.walk(pip_path):
+                dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    arcname = os.path.relpath(path, pip_path).replace(os.sep, "/")
+                    if arcname.startswith(WHEELHOUSE_PREFIX):
+                        shutil.copyfile(path, os.path.join(directory, name))
+                        continue
+                    if arcname.startswith(METADATA_PREFIX):
+                        arcname = arcname[len(METADATA_PREFIX):]
+                    wheel.write(path, arcname)
+        else:
+            with zipfile.ZipFile(pip_path) as pip_zip:
+                for info in pip_zip.infolist():
+                    arcname = info.filename
+                    if info.is_dir():
+                        continue
+                    if arcname.startswith(WHEELHOUSE_PREFIX):
+                        name = arcname[len(WHEELHOUSE_PREFIX):]
+                        with open(os.path.join(directory, name), "wb") as f:
+                            f.write(pip_zip.read(info))
+                        continue
+                    if arcname.startswith(METADATA_PREFIX):
+                        arcname = arcname[len(METADATA_PREFIX):]
+                    wheel.writestr(arcname, pip_zip.read(info))
+
+
+def pip_config_files():
+    """
+    Get the paths of the files that pip could read its configuration from.
+
+    This errs on the side of too many, covering every POSIX platform at once.
+    """
+    config_file = os.environ.get("PIP_CONFIG_FILE")
+    if config_file == os.devnull:
+        return []
+
+    xdg_dirs = os.environ.get("XDG_CONFIG_DIRS") or "/etc/xdg"
+    xdg_home = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    paths = [os.path.join(d, "pip", "pip.conf") for d in xdg_dirs.split(":")]
+    paths += [
+        "/etc/pip.conf",
+        "/Library/Application Support/pip/pip.conf",
+        os.path.expanduser("~/Library/Application Support/pip/pip.conf"),
+        os.path.expanduser("~/.pip/pip.conf"),
+        os.path.join(xdg_home, "pip", "pip.conf"),
+        os.path.join(sys.prefix, "pip.conf"),
+    ]
+    if config_file:
+        paths.append(config_file)
+    return paths
+
+
+def has_pip_settings():
+    """
+    Whether pip's configuration files or environment variables set any options
+    of `pip install`, other than those that parse_pip_options() ignores.
+    """
+    ignored = {{"config-file", "no-setuptools", "no-wheel", "quiet", "verbose"}}
+    for options in (PIP_VALUE_OPTIONS, PIP_FLAG_OPTIONS):
+        ignored.update(o.lstrip("-") for o, name in options.items() if name is None)
+
+    names = [key[len("PIP_"):] for key in os.environ if key.startswith("PIP_")]
+    config = configparser.RawConfigParser()
+    try:
+        config.read(pip_config_files())
+    except configparser.Error:
+        return True
+    for section in ("global", "install"):
+        if config.has_section(section):
+            names += config.options(section)
+    return any(n.lower().replace("_", "-") not in ignored for n in names)
+
+
+def determine_scheme(options):
+    """
+    Get the directories that pip would install pure-Python packages and scripts
+    into, given `options` from parse_pip_options(), or None to leave it to pip.
+
+    These come from sysconfig, as they do in pip. Older versions of pip use
+    distutils instead on Python 3.9 and older, which some Linux distributions
+    patch to install elsewhere, so those are left to pip if the two disagree.
+    """
+    if options.get("target"):
+        # pip installs into a temporary directory, and then moves the packages,
+        # and the directory with the scripts, into the target directory.
+        target = os.path.abspath(options["target"])
+        return target, os.path.join(target, "bin")
+
+    user = bool(options.get("user"))
+    prefix = options.get("prefix")
+    if hasattr(sysconfig, "get_preferred_scheme"):
+        scheme = sysconfig.get_preferred_scheme("user" if user else "prefix")
+    else:
+        scheme = "posix_user" if user else "posix_prefix"
+    if prefix and scheme == "osx_framework_library":
+        scheme = "posix_prefix"
+    variables = {{}}
+    if prefix:
+        keys = ["installed_base", "base", "installed_platbase", "platbase"]
+        keys += ["prefix", "exec_prefix"]
+        if sysconfig.get_config_var("userbase") is not None:
+            keys.append("userbase")
+        variables = dict.fromkeys(keys, prefix)
+    paths = sysconfig.get_paths(scheme, vars=variables)
+    scheme = (paths["purelib"], paths["scripts"])
+
+    use_sysconfig = getattr(sysconfig, "_PIP_USE_SYSCONFIG", None)
+    if use_sysconfig or (use_sysconfig is None and this_python >= (3, 10)):
+        return scheme
+
+    try:
+        from distutils.dist import Distribution
+    except ImportError:
+        return None
+    distribution = Distribution({{"name": "pip"}})
+    distribution.parse_config_files()
+    install = distribution.get_command_obj("install", create=True)
+    install.user = user
+    if user:
+        install.prefix = ""
+    install.prefix = prefix or install.prefix
+    install.finalize_options()
+    if (install.install_purelib, install.install_scripts) != scheme:
+        return None
+    return scheme
+
+
+def uninstall(dist_info, purelib, within=None):
+    """Remove the files that are listed in the RECORD in `dist_info`, as pip would.
+
+    The bytecode of the modules in it is removed too, for every version of
+    Python, and then the directories in `purelib` that are left empty. Only
+    files in `within` are removed, if it is given: pip records the scripts that
+    it installs with --target relative to the temporary directory that it
+    installed into, not to the target directory.
+    """
+    with open(os.path.join(dist_info, "RECORD"), newline="") as f:
+        rows = [row for row in csv.reader(f) if row]
+    paths = set(os.path.normpath(os.path.join(purelib, row[0])) for row in rows)
+    if within is not None:
+        paths = set(p for p in paths if p.startswith(within + os.sep))
+
+    for path in paths:
+        if os.path.isfile(path) or os.path.islink(path):
+            os.remove(path)
+
+    directories = set(map(os.path.dirname, paths))
+    for directory in directories:
+        cache = os.path.join(directory, "__pycache__")
+        if os.path.isdir(cache):
+            for name in os.listdir(cache):
+                source = os.path.join(directory, name.split(".")[0] + ".py")
+                if name.endswith(".pyc") and source in paths:
+                    os.remove(os.path.join(cache, name))
+            if not os.listdir(cache):
+                os.rmdir(cache)
+
+    # Deepest first, so that directories are emptied before their parents.
+    for directory in sorted(directories, key=len, reverse=True):
+        while (
+            directory.startswith(purelib + os.sep)
+            and os.path.isdir(directory)
+            and not os.listdir(directory)
+        ):
+            os.rmdir(directory)
+            directory = os.path.dirname(directory)
+
+
+def list_dist_infos(directory):
+    """
+    Map the names of the .dist-info directories in `directory` to the inode and
+    modification time of their RECORD, to tell what an install added or replaced.
+    """
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return {{}}
+    found = {{}}
+    for name in names:
+        if name.endswith(".dist-info"):
+            try:
+                stat = os.stat(os.path.join(directory, name, "RECORD"))
+            except OSError:
+                found[name] = None
+            else:
+                found[name] = (stat.st_ino, stat.st_mtime_ns)
+    return found
+
+
+def compile_workers():
+    """
+    The number of processes to compile bytecode in: one per available CPU.
+
+    Where worker processes are not forked, but started afresh (as they are on
+    Windows and macOS), they run this script again, which they cannot do when
+    it was read from stdin, and they have to be told to hide warnings, which
+    Python 3.6 cannot do. The modules are compiled in this process then.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        workers = len(os.sched_getaffinity(0))
+    else:
+        workers = os.cpu_count() or 1
+    if os.name == "nt":
+        # ProcessPoolExecutor supports no more than this, on Windows.
+        workers = min(workers, 61)
+    if workers > 1:
+        import multiprocessing
+        if multiprocessing.get_start_method() != "fork":
+            script = getattr(sys.modules["__main__"], "__file__", None)
+            if sys.version_info < (3, 7) or not (script and os.path.isfile(script)):
+                return 1
+    return workers
+
+
+def compile_installed(dist_infos, purelib, quiet=0):
+    """
+    Compile the modules of the distributions in `dist_infos`, in parallel.
+
+    These are installed in `purelib`, without bytecode, which pip would have
+    compiled one module at a time. The bytecode is added to their RECORDs, as
+    pip would have done too, and the time that it took is reported, unless
+    `quiet`.
+    """
+    started = time.time()
+    sources = {{}}
+    for dist_info in dist_infos:
+        with open(os.path.join(dist_info, "RECORD"), newline="") as f:
+            rows = [row for row in csv.reader(f) if row]
+        for row in rows:
+            path = os.path.normpath(os.path.join(purelib, row[0]))
+            if path.endswith(".py") and path.startswith(purelib + os.sep):
+                sources.setdefault(dist_info, []).append(path)
+
+    paths = [path for dist_info in sources for path in sources[dist_info]]
+    compile_file = functools.partial(compileall.compile_file, force=True, quiet=2)
+    workers = min(compile_workers(), len(paths))
+    compiled = None
+    if workers > 1:
+        try:
+            # Imported here, as only this needs it, and process pools are not
+            # supported everywhere (without sem_open(), for instance).
+            from concurrent.futures.process import (
+                BrokenProcessPool,
+                ProcessPoolExecutor,
+            )
+        except ImportError:
+            workers = 1
+    with warnings.catch_warnings():
+        # pip hides the warnings about the code in the modules, like these.
+        # Worker processes that are not forked do not inherit this filter.
+        warnings.simplefilter("ignore")
+        if workers > 1:
+            kwargs = {{}}
+            if sys.version_info >= (3, 7):
+                kwargs["initializer"] = warnings.simplefilter
+                kwargs["initargs"] = ("ignore",)
+            try:
+                with ProcessPoolExecutor(workers, **kwargs) as executor:
+                    chunksize = max(1, len(paths) // (workers * 4))
+                    compiled = list(
+                        executor.map(compile_file, paths, chunksize=chunksize)
+                    )
+            except (
+                BrokenProcessPool,
+                ImportError,
+                NotImplementedError,
+                OSError,
+                ValueError,
+            ):
+                # Whatever was compiled already is compiled again, below.
+                compiled = None
+        if compiled is None:
+            workers = 1
+            compiled = list(map(compile_file, paths))
+    compiled = dict(zip(paths, compiled))
+
+    for dist_info, paths in sources.items():
+        # Like pip, which does not hash the files that it generates.
+        rows = [
+            [os.path.relpath(importlib.util.cache_from_source(path), purelib), "", ""]
+            for path in paths
+            if compiled[path]
+        ]
+        with open(os.path.join(dist_info, "RECORD"), "a", newline="") as f:
+            csv.writer(f).writerows(rows)
+
+    if quiet <= 0:
+        print(
+            "Compiled {{}} modules in {{:.2f}}s, in {{}} process{{}}.".format(
+                len(compiled),
+                time.time() - started,
+                workers,
+                "es" if workers > 1 else "",
+            )
+        )
+
+
+# The console scripts that install_wheel() writes, which are those that pip
+# would write on POSIX platforms.
+SCRIPT = """# -*- coding: utf-8 -*-
+import re
+import sys
+from {{module}} import {{name}}
+if __name__ == "__main__":
+    sys.argv[0] = re.sub(r"(-script\\.pyw|\\.exe)?$", "", sys.argv[0])
+    sys.exit({{function}}())
+"""
+
+
+def console_scripts(wheel, dist_info):
+    """
+    Get the console scripts of `wheel`, as a dict of their names to their
+    entry points.
+
+    pip's own wheel has scripts named after the version of Python that it was
+    built with, which are replaced with ones for this Python, as pip does.
+    """
+    entry_points = configparser.RawConfigParser(delimiters=("=",))
+    entry_points.optionxform = str
+    if dist_info + "/entry_points.txt" in wheel.namelist():
+        text = wheel.read(dist_info + "/entry_points.txt").decode("utf-8")
+        entry_points.read_string(text)
+    if not entry_points.has_section("console_scripts"):
+        return {{}}
+
+    scripts = dict(entry_points.items("console_scripts"))
+    if "pip" in scripts:
+        for name in list(scripts):
+            if re.match(r"pip\d", name):
+                del scripts[name]
+        scripts["pip%d" % sys.version_info[0]] = scripts["pip"]
+        scripts["pip%d.%d" % sys.version_info[:2]] = scripts["pip"]
+    return scripts
+
+
+def install_wheel(path, purelib, scripts_dir):
+    """
+    Install the pure-Python wheel at `path` into `purelib`, as pip would.
+
+    Its console scripts are written into `scripts_dir`, it is marked as having
+    been installed by pip, and every file that is installed for it is listed in
+    its RECORD, for pip to uninstall it with later. Its modules are compiled
+    afterwards, by compile_installed(). Returns the names of its scripts.
+    """
+    rows = []
+
+    def record(dest, data):
+        digest = urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b"=")
+        rows.append([
+            os.path.relpath(dest, purelib),
+            "sha256=" + digest.decode("ascii"),
+            str(len(data)),
+        ])
+
+    def write(dest, data):
+        if not os.path.isdir(os.path.dirname(dest)):
+            os.makedirs(os.path.dirname(dest))
+        with open(dest, "wb") as f:
+            f.write(data)
+        record(dest, data)
+
+    dist_info = "-".join(os.path.basename(path).split("-")[:2]) + ".dist-info"
+    with zipfile.ZipFile(path) as wheel:
+        for info in wheel.infolist():
+            if info.is_dir() or info.filename == dist_info + "/RECORD":
+                continue
+            dest = os.path.join(purelib, *info.filename.split("/"))
+            write(dest, wheel.read(info))
+        scripts = console_scripts(wheel, dist_info)
+
+    shebang = "#!" + sys.executable
+    if " " in sys.executable or len(shebang) >= 127:
+        # The kernel cannot run these, so the script runs itself through sh.
+        shebang = "#!/bin/sh\n'''exec' \"{{}}\" \"$0\" \"$@\"\n' '''".format(
+            sys.executable
+        )
+    for name, entry_point in sorted(scripts.items()):
+        module, _, attrs = entry_point.split("[")[0].strip().partition(":")
+        script = SCRIPT.format(module=module, name=attrs.split(".")[0], function=attrs)
+        dest = os.path.join(scripts_dir, name)
+        write(dest, (shebang + "\n" + script).encode("utf-8"))
+        os.chmod(dest, (os.stat(dest).st_mode | 0o555) & 0o7777)
+
+    write(os.path.join(purelib, dist_info, "INSTALLER"), b"pip\n")
+    write(os.path.join(purelib, dist_info, "REQUESTED"), b"")
+
+    record_path = os.path.join(purelib, dist_info, "RECORD")
+    rows.append([os.path.relpath(record_path, purelib), "", ""])
+    with open(record_path, "w", newline="") as f:
+        csv.writer(f).writerows(rows)
+    return sorted(scripts)
+
+
+def read_requirements(path):
+    """
+    Get the names of the distributions that the wheel at `path` requires.
+
+    These are read from the Requires-Dist of its METADATA, leaving out the ones
+    that only apply with an extra. Returns None if any other requirement has a
+    marker, as only pip can evaluate those.
+    """
+    with zipfile.ZipFile(path) as wheel:
+        for name in wheel.namelist():
+            directory, _, filename = name.partition("/")
+            if directory.endswith(".dist-info") and filename == "METADATA":
+                metadata = wheel.read(name).decode("utf-8")
+                break
+        else:
+            return None
+
+    names = []
+    for line in metadata.splitlines():
+        if not line.strip():
+            # The headers end here, and the description starts.
+            break
+        if not line.startswith("Requires-Dist:"):
+            continue
+        requirement, _, marker = line[len("Requires-Dist:"):].partition(";")
+        if "extra" in marker and " or " not in marker:
+            continue
+        if marker.strip():
+            return None
+        name = re.match(r"\s*([A-Za-z0-9._-]+)", requirement).group(1)
+        names.append(normalize_name(name))
+    return names
+
+
+def install_without_pip(pip_path, tmpdir):
+    """
+    Install pip from `pip_path` without running it, where that is possible.
+
+    Importing pip's command line, resolver and network stack takes far longer
+    than installing its wheel, and any wheels that are bundled with it. This is
+    only done on POSIX platforms, when nothing but these would be installed,
+    with options that parse_pip_options() understands and no settings for pip,
+    and when nothing is installed that pip would have to decide what to do about.
+    That includes whatever they require, which has to be bundled too. Returns
+    the exit status, or None if pip has to be run instead.
+    """
+    pre, args = parse_get_pip_arguments()
+    options = parse_pip_options(args)
+    if os.name != "posix" or options is None or has_pip_settings():
+        return None
+
+    projects = determine_projects(pre)
+    if not set(projects[1:]) <= set(BUNDLED_PROJECTS):
+        return None
+
+    # pip refuses these, with an explanation.
+    site = sys.modules.get("site")
+    if options.get("user") and not getattr(site, "ENABLE_USER_SITE", False):
+        return None
+    in_venv = sys.prefix != getattr(sys, "base_prefix", sys.prefix)
+    marker = os.path.join(sysconfig.get_path("stdlib"), "EXTERNALLY-MANAGED")
+    elsewhere = options.get("target") or options.get("prefix")
+    if os.path.isfile(marker) and not (in_venv or elsewhere):
+        return None
+
+    scheme = determine_scheme(options)
+    if scheme is None:
+        return None
+    purelib, scripts_dir = [os.path.normpath(os.path.abspath(d)) for d in scheme]
+
+    # Anything that is installed already has to be in `purelib`, with a RECORD
+    # to uninstall it with, unless it is elsewhere on sys.path, with --target.
+    # A pip that is newer than this one is never replaced by it.
+    existing = {{}}
+    for project in projects:
+        existing[project] = list(find_metadata(project, [purelib]))
+        for dist_info in existing[project]:
+            if not os.path.isfile(os.path.join(dist_info, "RECORD")):
+                return None
+            version = os.path.splitext(os.path.basename(dist_info))[0].split("-")[1]
+            if project == "pip" and is_newer_than_this(version):
+                return None
+        found = next(find_metadata(project, sys.path), None)
+        if found and not options.get("target"):
+            if os.path.realpath(os.path.dirname(found)) != os.path.realpath(purelib):
+                return None
+
+    wheelhouse = os.path.join(tmpdir, "wheelhouse")
+    build_wheel(pip_path, wheelhouse)
+    wheels = {{}}
+    for filename in os.listdir(wheelhouse):
+        name = normalize_name(filename.split("-")[0])
+        wheels[name] = os.path.join(wheelhouse, filename)
+
+    # What they require is installed along with them, from the wheelhouse. Only
+    # pip can tell whether an installed version of it satisfies them, though.
+    pending = list(projects)
+    while pending:
+        requirements = read_requirements(wheels[pending.pop(0)])
+        if requirements is None:
+            return None
+        for name in requirements:
+            if name in projects:
+                continue
+            if name not in wheels or next(find_metadata(name, sys.path), None):
+                return None
+            if next(find_metadata(name, [purelib]), None):
+                return None
+            projects.append(name)
+            existing[name] = []
+            pending.append(name)
+
+    for project in projects:
+        with zipfile.ZipFile(wheels[project]) as wheel:
+            # Only files that go into `purelib` are supported, not .data.
+            if any(n.split("/")[0].endswith(".data") for n in wheel.namelist()):
+                return None
+
+    installed = []
+    scripts = []
+    try:
+        for project in projects:
+            for dist_info in existing[project]:
+                uninstall(dist_info, purelib, options.get("target") and purelib)
+            scripts += install_wheel(wheels[project], purelib, scripts_dir)
+            filename = os.path.basename(wheels[project])
+            installed.append("-".join(filename.split("-")[:2]))
+        if not options.get("no_compile"):
+            dist_infos = [
+                os.path.join(purelib, name + ".dist-info") for name in installed
+            ]
+            compile_installed(dist_infos, purelib, options["quiet"])
+    except OSError as exc:
+        print("ERROR: Could not install packages due to an OSError: {{}}".format(exc))
+        return 1
+
+    if options["quiet"] > 0:
+        return 0
+
+    path = os.environ.get("PATH", "").split(os.pathsep)
+    path = [os.path.normpath(p) for p in path if p]
+    path.append(os.path.dirname(sys.executable))
+    warn = not (options.get("no_warn_script_location") or options.get("target"))
+    if scripts and warn and scripts_dir not in path:
+        print(
+            "WARNING: The scripts {{}} are installed in '{{}}' which is not on "
+            "PATH.".format(", ".join(scripts), scripts_dir)
+        )
+    print("Successfully installed " + " ".join(installed))
+    return 0
 
 
 def monkeypatch_for_cert(tmpdir):
@@ -91,12 +888,20 @@ def monkeypatch_for_cert(tmpdir):
     A monkeypatch is the easiest way to achieve this, without messing too much with
     the rest of pip's internals.
     """
-    from pip._internal.commands.install import InstallCommand
-
     # We want to be using the internal certificates.
-    cert_path = os.path.join(tmpdir, "cacert.pem")
-    with open(cert_path, "wb") as cert:
-        cert.write(pkgutil.get_data("pip._vendor.certifi", "cacert.pem"))
+    cert_data = pkgutil.get_data("pip._vendor.certifi", "cacert.pem")
+    if tmpdir is None:
+        # Nothing is written to disk, so keep the certificates in memory too,
+        # and stop certifi from extracting its own copy of them.
+        cert_path = memory_file("cacert.pem", [cert_data])
+        certifi = importlib.import_module("pip._vendor.certifi")
+        certifi.where = lambda: cert_path
+    else:
+        cert_path = os.path.join(tmpdir, "cacert.pem")
+        with open(cert_path, "wb") as cert:
+            cert.write(cert_data)
+
+    from pip._internal.commands.install import InstallCommand
 
     install_parse_args = InstallCommand.parse_args
 
@@ -109,38 +914,220 @@ def monkeypatch_for_cert(tmpdir):
     InstallCommand.parse_args = cert_parse_args
 
 
-def bootstrap(tmpdir):
+def can_run_in_memory():
+    """
+    Anonymous files in memory are only available on Linux, with Python 3.8+.
+    """
+    return hasattr(os, "memfd_create") and os.path.isdir("/proc/self/fd")
+
+
+def memory_file(name, chunks):
+    """
+    Write `chunks` into an anonymous file in memory, and return a path to it.
+
+    The file lasts for as long as this process does.
+    """
+    fd = os.memfd_create(name)
+    for chunk in chunks:
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(fd, view):]
+    return "/proc/self/fd/{{}}".format(fd)
+
+
+@contextlib.contextmanager
+def locked(path):
+    """Hold an exclusive lock on the file at `path`, creating it if needed."""
+    with open(path, "ab") as f:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        yield
+
+
+def unpack_into_cache(cache_dir):
+    """Get a directory with pip unpacked and compiled, from the cache.
+
+    Entries are keyed by the sha256 of the payload, and are never modified once
+    they are published. They are built in a temporary directory, which is only
+    renamed into place once it is complete, while holding a lock so that
+    concurrent runs on the same host wait for the first one, rather than
+    repeating its work.
+    """
+    entry = os.path.join(cache_dir, PAYLOAD_SHA256)
+    if os.path.isdir(entry):
+        return entry
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    with locked(entry + ".lock"):
+        if os.path.isdir(entry):
+            return entry
+
+        building = tempfile.mkdtemp(prefix=".building-", dir=cache_dir)
+        try:
+            unpack_payload(building)
+            compileall.compile_dir(building, quiet=1)
+            os.rename(building, entry)
+        finally:
+            shutil.rmtree(building, ignore_errors=True)
+
+    return entry
+
+
+def iter_payload(lines_per_chunk=1000):
+    """Decode the file in DATA, a chunk at a time.
+
+    Only one chunk is held in memory at once, besides DATA itself. Every chunk
+    is a whole number of lines, which decode independently of the lines around
+    them: each line of base64 encodes 57 bytes, and every 5 lines of base85
+    encode 316 bytes, so `lines_per_chunk` has to be a multiple of 5. Only the
+    last line of DATA can be shorter than the rest.
+    """
+    # DATA starts with a newline, so this is the length of a line, with its newline.
+    chunk_size = DATA.index(b"\n", 1) * lines_per_chunk
+    for start in range(1, len(DATA), chunk_size):
+        chunk = DATA[start:start + chunk_size]
+        if PAYLOAD_CODEC == "base64":
+            # Decoded in C, skipping over the newlines as it goes.
+            yield binascii.a2b_base64(chunk)
+        else:
+            yield b85decode(chunk.replace(b"\n", b""))
+
+
+def unpack_payload(directory):
+    """Unpack the files in DATA into `directory`, whatever its PAYLOAD_FORMAT."""
+    with tempfile.TemporaryFile() as archive:
+        for chunk in iter_payload():
+            archive.write(chunk)
+        archive.seek(0)
+        if PAYLOAD_FORMAT == "zip":
+            with zipfile.ZipFile(archive) as pip_zip:
+                pip_zip.extractall(directory)
+        else:
+            # Imported here, as Python can be built without the lzma module
+            # that this needs, and without it only this payload format fails.
+            import tarfile
+            kwargs = {{}}
+            if hasattr(tarfile, "data_filter"):
+                kwargs["filter"] = "data"
+            with tarfile.open(fileobj=archive, mode="r:xz") as tar:
+                tar.extractall(directory, **kwargs)
+
+
+def bootstrap(tmpdir, pip_path=None):
+    if pip_path and tmpdir:
+        status = install_without_pip(pip_path, tmpdir)
+        if status is not None:
+            sys.exit(status)
+
     monkeypatch_for_cert(tmpdir)
 
-    # Execute the included pip and use it to install the latest pip and
-    # any user-requested packages from PyPI.
+    # Execute the included pip and use it to install pip (itself, or the latest
+    # from PyPI) and any user-requested packages from PyPI.
     from pip._internal.cli.main import main as pip_entry_point
-    args = determine_pip_install_arguments()
-    sys.exit(pip_entry_point(args))
+    args = determine_pip_install_arguments(pip_path, tmpdir)
+
+    # pip would compile the modules one at a time, so do that afterwards, in
+    # parallel, if this knows where pip installs them to, as it does with no
+    # arguments or settings that parse_pip_options() does not understand. That
+    # covers everything that pip installed there, including any dependencies.
+    _, pip_args = parse_get_pip_arguments()
+    options = parse_pip_options(pip_args)
+    scheme = None
+    if options and not options.get("no_compile") and not has_pip_settings():
+        scheme = determine_scheme(options)
+    if scheme is None:
+        sys.exit(pip_entry_point(args))
+
+    purelib = os.path.normpath(os.path.abspath(scheme[0]))
+    before = list_dist_infos(purelib)
+    status = pip_entry_point(args + ["--no-compile"])
+    if status == 0:
+        after = list_dist_infos(purelib)
+        dist_infos = [
+            os.path.join(purelib, name)
+            for name in sorted(after)
+            if after[name] is not None and before.get(name) != after[name]
+        ]
+        compile_installed(dist_infos, purelib, options["quiet"])
+    sys.exit(status)
 
 
 def main():
+    pre, args = parse_get_pip_arguments()
+    if pre.skip_if_installed and is_installed(pre, args):
+        print("pip {installed_version} is already installed, skipping.")
+        return
+
     tmpdir = None
     try:
-        # Create a temporary working directory
-        tmpdir = tempfile.mkdtemp()
+        pip_path = None
+        if pre.in_memory:
+            if not can_run_in_memory():
+                print("WARNING: --in-memory needs Linux, and Python 3.8 or newer")
+            elif PAYLOAD_FORMAT != "zip":
+                print("WARNING: --in-memory needs a copy of pip in a zip file")
+            else:
+                # Import pip from a zipfile in memory, without any temporary files
+                pip_path = memory_file("pip.zip", iter_payload())
+
+        if pip_path is None:
+            # Create a temporary working directory
+            tmpdir = tempfile.mkdtemp()
+
+            # Use pip from the cache, if there is one, unpacking it there first
+            # if this is the first run that needs it
+            cache_dir = pre.bootstrap_cache_dir
+            cache_dir = cache_dir or os.environ.get("GET_PIP_BOOTSTRAP_CACHE_DIR")
+            if cache_dir:
+                try:
+                    pip_path = unpack_into_cache(cache_dir)
+                except OSError as exc:
+                    print("WARNING: Not using the bootstrap cache: {{}}".format(exc))
+
+        if pip_path is None and PAYLOAD_FORMAT != "zip":
+            # Unpack the files into the temporary directory
+            pip_path = os.path.join(tmpdir, "pip")
+            unpack_payload(pip_path)
 
-        # Unpack the zipfile into the temporary directory
-        pip_zip = os.path.join(tmpdir, "pip.zip")
-        with open(pip_zip, "wb") as fp:
-            fp.write(b85decode(DATA.replace(b"\n", b"")))
+        if pip_path is None:
+            # Unpack the zipfile into the temporary directory
+            pip_path = os.path.join(tmpdir, "pip.zip")
+            with open(pip_path, "wb") as fp:
+                for chunk in iter_payload():
+                    fp.write(chunk)
 
-        # Add the zipfile to sys.path so that we can import it
-        sys.path.insert(0, pip_zip)
+        # Add pip to sys.path so that we can import it
+        sys.path.insert(0, pip_path)
 
         # Run the bootstrap
-        bootstrap(tmpdir=tmpdir)
+        bootstrap(tmpdir=tmpdir, pip_path=pip_path)
     finally:
         # Clean up our temporary working directory
         if tmpdir:
             shutil.rmtree(tmpdir, ignore_errors=True)
 
 
+# The sha256 of the file in DATA, which is what the bootstrap cache is keyed by.
+PAYLOAD_SHA256 = "{payload_sha256}"
+
+PAYLOAD_CODEC = "{payload_codec}"
+
+PAYLOAD_FORMAT = "{payload_format}"
+
+# pip's wheel is rebuilt from DATA, with the files under METADATA_PREFIX moved
+# back to where they were in it.
+WHEEL_FILENAME = "{wheel_filename}"
+METADATA_PREFIX = "{metadata_prefix}"
+
+# The projects whose wheels are bundled with pip, under WHEELHOUSE_PREFIX.
+BUNDLED_PROJECTS = {bundled_projects}
+WHEELHOUSE_PREFIX = "{wheelhouse_prefix}"
+
 DATA = b"""
 {zipfile}
 """